@@ -5,8 +5,17 @@ from pathlib import Path
 long_description = \
     (Path(__file__).parent / "README.md").read_text(encoding="utf8")
 
+# read version
+version = {}
+exec(
+    (Path(__file__).parent / "uniquipy" / "version.py").read_text(
+        encoding="utf8"
+    ),
+    version
+)
+
 setup(
-    version="1.1.0",
+    version=version["__version__"],
     name="uniquipy",
     description="python cli-tool to find and handle file duplicates",
     long_description=long_description,
@@ -23,6 +32,9 @@ setup(
     install_requires=[
         "click>=8.1.7,<9.0.0",
     ],
+    extras_require={
+        "zstd": ["zstandard>=0.15"],
+    },
     packages=[
         "uniquipy",
     ],
@@ -7,12 +7,24 @@ Run with
 pytest -v -s --cov=uniquipy.src
 """
 
+import os
+import sys
+import json
+import errno
+import ctypes
+import ctypes.util
+import socket
+import subprocess
+from time import sleep
+from threading import Thread, Event
 from pathlib import Path
-from shutil import rmtree
+from shutil import rmtree, copyfile
 import hashlib
 import pytest
+import click
 from click.testing import CliRunner
-from uniquipy import src, analyze, pack
+from uniquipy import src, analyze, pack, compress, archive, verify, dedupe, \
+    watch, cli
 
 @pytest.fixture(scope="session")
 def WORKING_DIR():
@@ -334,3 +346,1109 @@ def test_unpack(WORKING_DIR):
     assert (this_working_dir_out / "test_.txt").read_bytes() == b"test1"
     assert (this_working_dir_out / "test2.txt").is_file()
     assert (this_working_dir_out / "test2.txt").read_bytes() == b"test2"
+
+
+def test_is_compressible(WORKING_DIR):
+    """
+    Test functionality of function `is_compressible`.
+    """
+
+    this_working_dir = WORKING_DIR / "test_is_compressible"
+    this_working_dir.mkdir(parents=True, exist_ok=False)
+
+    # write test-files
+    (this_working_dir / "test.txt").write_bytes(b"test1"*1000)
+    (this_working_dir / "test.gz").write_bytes(b"test1"*1000)
+    (this_working_dir / "test.bin").write_bytes(os.urandom(10000))
+    (this_working_dir / "empty.txt").write_bytes(b"")
+
+    assert compress.is_compressible(this_working_dir / "test.txt")
+    assert not compress.is_compressible(this_working_dir / "test.gz")
+    assert not compress.is_compressible(this_working_dir / "test.bin")
+    assert not compress.is_compressible(this_working_dir / "empty.txt")
+
+
+@pytest.mark.parametrize("compression", compress.COMPRESSION_METHODS)
+def test_unpack_compressed(WORKING_DIR, compression):
+    """
+    Test functionality of the cli commands `pack` and `unpack` with
+    compression.
+    """
+
+    this_working_dir_in = WORKING_DIR / "test_packunpack_compressed"
+    this_working_dir_intermediate = WORKING_DIR / "test_packed_compressed"
+    this_working_dir_out = WORKING_DIR / "test_unpacked_compressed"
+    for d in [
+        this_working_dir_in,
+        this_working_dir_intermediate,
+        this_working_dir_out
+    ]:
+        if d.is_dir():
+            rmtree(d)
+    (this_working_dir_in / "sub").mkdir(parents=True, exist_ok=False)
+
+    # write test-files
+    random_data = os.urandom(10000)
+    (this_working_dir_in / "test.txt").write_bytes(b"test1"*1000)
+    (this_working_dir_in / "sub" / "test_.txt").write_bytes(b"test1"*1000)
+    (this_working_dir_in / "test2.bin").write_bytes(random_data)
+
+    runner = CliRunner()
+    result = runner.invoke(
+        pack.pack,
+        [
+            "-i", str(this_working_dir_in),
+            "-o", str(this_working_dir_intermediate),
+            "-c", compression, "-j", "2"
+        ]
+    )
+
+    assert result.exit_code == 0
+
+    # incompressible data is stored as is
+    assert (this_working_dir_intermediate / "data" / "test2.bin").read_bytes() \
+        == random_data
+    manifest = json.loads(
+        (this_working_dir_intermediate / "manifest.json").read_text(encoding="utf-8")
+    )
+    assert manifest["compression"] == compress.resolve_method(compression)
+    assert manifest["blobs"]["test2.bin"]["compression"] is None
+    assert len(manifest["blobs"]) == 2
+    for key, blob in manifest["blobs"].items():
+        if key != "test2.bin":
+            assert blob["compression"] == manifest["compression"]
+
+    result = runner.invoke(
+        pack.unpack,
+        ["-i", str(this_working_dir_intermediate), "-o", str(this_working_dir_out)]
+    )
+
+    assert result.exit_code == 0
+    assert (this_working_dir_out / "test.txt").read_bytes() == b"test1"*1000
+    assert (this_working_dir_out / "sub" / "test_.txt").read_bytes() == b"test1"*1000
+    assert (this_working_dir_out / "test2.bin").read_bytes() == random_data
+
+
+@pytest.mark.parametrize("compression", [None, "gzip"])
+def test_unpack_container(WORKING_DIR, compression):
+    """
+    Test functionality of the cli commands `pack` and `unpack` with
+    container format.
+    """
+
+    this_working_dir_in = WORKING_DIR / "test_packunpack_container"
+    this_working_dir_intermediate = WORKING_DIR / "test_packed_container.uniquipy"
+    this_working_dir_out = WORKING_DIR / "test_unpacked_container"
+    if this_working_dir_in.is_dir():
+        rmtree(this_working_dir_in)
+    if this_working_dir_intermediate.is_file():
+        this_working_dir_intermediate.unlink()
+    if this_working_dir_out.is_dir():
+        rmtree(this_working_dir_out)
+    (this_working_dir_in / "sub").mkdir(parents=True, exist_ok=False)
+
+    # write test-files
+    (this_working_dir_in / "test.txt").write_bytes(b"test1"*1000)
+    (this_working_dir_in / "sub" / "test_.txt").write_bytes(b"test1"*1000)
+    (this_working_dir_in / "test2.txt").write_bytes(b"test2")
+
+    runner = CliRunner()
+    result = runner.invoke(
+        pack.pack,
+        [
+            "-i", str(this_working_dir_in),
+            "-o", str(this_working_dir_intermediate),
+            "--container"
+        ] + (["-c", compression] if compression else [])
+    )
+
+    assert result.exit_code == 0
+    assert this_working_dir_intermediate.is_file()
+
+    with archive.open_archive(this_working_dir_intermediate) as reader:
+        assert isinstance(reader, archive.ContainerReader)
+        assert len(reader.groups) == 2
+        assert reader.blobs["test2.txt"]["digest"] == hashlib.md5(b"test2").hexdigest()
+        assert reader.blobs["test2.txt"]["size"] == 5
+
+    result = runner.invoke(
+        pack.unpack,
+        ["-i", str(this_working_dir_intermediate), "-o", str(this_working_dir_out)]
+    )
+
+    assert result.exit_code == 0
+    assert (this_working_dir_out / "test.txt").read_bytes() == b"test1"*1000
+    assert (this_working_dir_out / "sub" / "test_.txt").read_bytes() == b"test1"*1000
+    assert (this_working_dir_out / "test2.txt").read_bytes() == b"test2"
+
+
+def test_extract(WORKING_DIR):
+    """
+    Test functionality of the cli command `extract`.
+    """
+
+    this_working_dir_in = WORKING_DIR / "test_extract"
+    this_working_dir_intermediate = WORKING_DIR / "test_extract.uniquipy"
+    this_working_dir_out = WORKING_DIR / "test_extracted"
+    (this_working_dir_in / "sub").mkdir(parents=True, exist_ok=False)
+
+    # write test-files
+    (this_working_dir_in / "test.txt").write_bytes(b"test1")
+    (this_working_dir_in / "sub" / "test_.txt").write_bytes(b"test1")
+    (this_working_dir_in / "test2.txt").write_bytes(b"test2")
+
+    runner = CliRunner()
+    result = runner.invoke(
+        pack.pack,
+        [
+            "-i", str(this_working_dir_in),
+            "-o", str(this_working_dir_intermediate),
+            "--container", "-c", "lzma"
+        ]
+    )
+
+    assert result.exit_code == 0
+
+    result = runner.invoke(
+        pack.extract,
+        [
+            "-i", str(this_working_dir_intermediate),
+            "-p", "sub/test_.txt",
+            "-o", str(this_working_dir_out)
+        ]
+    )
+
+    assert result.exit_code == 0
+    assert (this_working_dir_out / "sub" / "test_.txt").read_bytes() == b"test1"
+    assert not (this_working_dir_out / "test.txt").exists()
+    assert not (this_working_dir_out / "test2.txt").exists()
+
+    # unknown path
+    result = runner.invoke(
+        pack.extract,
+        [
+            "-i", str(this_working_dir_intermediate),
+            "-p", "test3.txt",
+            "-o", str(this_working_dir_out)
+        ]
+    )
+
+    assert result.exit_code == 1
+
+
+def test_hash_from_samples(WORKING_DIR):
+    """
+    Test functionality of function `hash_from_samples`.
+    """
+
+    data = b"a"*1000 + b"b"*1000 + b"c"*1000
+
+    # write test-file
+    test_file = WORKING_DIR / "test_samples.txt"
+    test_file.write_bytes(data)
+
+    with open(test_file, "rb") as stream:
+        hashed = src.hash_from_samples(
+            "md5", stream, len(data), block_size=10, samples=3
+        )
+
+    assert hashed == hashlib.md5(
+        data[:10] + data[1495:1505] + data[-10:]
+    ).hexdigest()
+
+
+@pytest.mark.parametrize("container", [False, True])
+def test_verify(WORKING_DIR, container):
+    """
+    Test functionality of the cli command `verify`.
+    """
+
+    this_working_dir_in = WORKING_DIR / "test_verify"
+    this_working_dir_out = WORKING_DIR / "test_verify_packed"
+    if this_working_dir_in.is_dir():
+        rmtree(this_working_dir_in)
+    if this_working_dir_out.is_dir():
+        rmtree(this_working_dir_out)
+    if this_working_dir_out.is_file():
+        this_working_dir_out.unlink()
+    this_working_dir_in.mkdir(parents=True, exist_ok=False)
+
+    # write test-files
+    (this_working_dir_in / "test.txt").write_bytes(b"test1"*1000)
+    (this_working_dir_in / "test_.txt").write_bytes(b"test1"*1000)
+    (this_working_dir_in / "test2.txt").write_bytes(b"test2")
+
+    runner = CliRunner()
+    result = runner.invoke(
+        pack.pack,
+        ["-i", str(this_working_dir_in), "-o", str(this_working_dir_out), "-c", "gzip"]
+        + (["--container"] if container else [])
+    )
+
+    assert result.exit_code == 0
+
+    for fast in [False, True]:
+        result = runner.invoke(
+            verify.verify,
+            ["-i", str(this_working_dir_out), "-v"] + (["--fast"] if fast else [])
+        )
+
+        assert result.exit_code == 0
+        assert "archive is intact" in result.output
+
+    # damage data
+    if container:
+        with archive.open_archive(this_working_dir_out) as reader:
+            offset = reader.blobs["test2.txt"]["offset"]
+        with open(this_working_dir_out, "r+b") as file:
+            file.seek(offset)
+            file.write(b"x")
+    else:
+        (this_working_dir_out / "data" / "test2.txt").write_bytes(b"test3")
+
+    for fast in [False, True]:
+        result = runner.invoke(
+            verify.verify,
+            ["-i", str(this_working_dir_out)] + (["--fast"] if fast else [])
+        )
+
+        assert result.exit_code == 1
+        assert result.output.strip() == "corrupt: test2.txt"
+
+    if container:
+        return
+
+    # remove data
+    (this_working_dir_out / "data" / "test2.txt").unlink()
+
+    result = runner.invoke(
+        verify.verify, ["-i", str(this_working_dir_out)]
+    )
+
+    assert result.exit_code == 1
+    assert result.output.strip() == "missing: test2.txt"
+
+
+@pytest.mark.parametrize("compression", [None, "gzip"])
+def test_restore_blob(WORKING_DIR, compression):
+    """
+    Test functionality of function `restore_blob` with multiple
+    destinations.
+    """
+
+    this_working_dir = WORKING_DIR / f"test_restore_blob_{compression}"
+    this_working_dir.mkdir(parents=True, exist_ok=False)
+
+    # write test-file
+    data = b"test1"*100000
+    (this_working_dir / "test.txt").write_bytes(data)
+    with open(this_working_dir / "blob", "w+b") as stream:
+        archive.store_blob(this_working_dir / "test.txt", stream, compression)
+
+    # restore with more destinations than simultaneously opened files
+    destinations = [this_working_dir / f"test{i}.txt" for i in range(5)]
+    with open(this_working_dir / "blob", "rb") as stream:
+        archive.restore_blob(
+            stream, destinations, compression, max_open_files=2
+        )
+
+    for destination in destinations:
+        assert destination.read_bytes() == data
+
+
+@pytest.mark.parametrize("mode", dedupe.DEDUPE_MODES)
+def test_dedupe(WORKING_DIR, mode):
+    """
+    Test functionality of the cli command `dedupe`.
+    """
+
+    this_working_dir = WORKING_DIR / f"test_dedupe_{mode}"
+    (this_working_dir / "sub").mkdir(parents=True, exist_ok=False)
+
+    # write test-files
+    (this_working_dir / "test.txt").write_bytes(b"test1")
+    (this_working_dir / "sub" / "test_.txt").write_bytes(b"test1")
+    (this_working_dir / "test2.txt").write_bytes(b"test2")
+
+    runner = CliRunner()
+    result = runner.invoke(
+        dedupe.dedupe, ["-i", str(this_working_dir), "--mode", mode]
+    )
+
+    assert (this_working_dir / "test2.txt").read_bytes() == b"test2"
+    files = [
+        this_working_dir / "test.txt", this_working_dir / "sub" / "test_.txt"
+    ]
+    if mode == "reflink" and result.exit_code == 1:
+        # filesystem does not support reflinks; data remain untouched
+        for file in files:
+            assert file.read_bytes() == b"test1"
+        assert not list(this_working_dir.glob("**/*.uniquipy-tmp"))
+        return
+
+    assert result.exit_code == 0
+    if mode == "delete":
+        assert len([file for file in files if file.is_file()]) == 1
+    else:
+        for file in files:
+            assert file.read_bytes() == b"test1"
+        assert not list(this_working_dir.glob("**/*.uniquipy-tmp"))
+    if mode == "hardlink":
+        assert files[0].stat().st_ino == files[1].stat().st_ino
+
+
+def test_duplicate_index(WORKING_DIR, monkeypatch):
+    """
+    Test functionality of class `DuplicateIndex`.
+    """
+
+    this_working_dir = WORKING_DIR / "test_duplicate_index"
+    this_working_dir.mkdir(parents=True, exist_ok=False)
+
+    # write test-files
+    (this_working_dir / "test.txt").write_bytes(b"test1")
+    (this_working_dir / "test_.txt").write_bytes(b"test1")
+    (this_working_dir / "test2.txt").write_bytes(b"test2")
+
+    index = watch.DuplicateIndex(this_working_dir)
+    index.rescan()
+
+    assert index.groups() == [
+        [this_working_dir / "test.txt", this_working_dir / "test_.txt"]
+    ]
+
+    # only new files are hashed
+    hashed = []
+    hash_from_file = src.hash_from_file
+    monkeypatch.setattr(
+        src,
+        "hash_from_file",
+        lambda algorithm, path, *args: \
+            hashed.append(path) or hash_from_file(algorithm, path, *args)
+    )
+    (this_working_dir / "test2_.txt").write_bytes(b"test2")
+    (this_working_dir / "test.txt").unlink()
+    index.rescan()
+
+    assert index.groups() == [
+        [this_working_dir / "test2.txt", this_working_dir / "test2_.txt"]
+    ]
+    assert str(this_working_dir / "test.txt") not in hashed
+    assert str(this_working_dir / "test_.txt") not in hashed
+    assert str(this_working_dir / "test2_.txt") in hashed
+
+
+@pytest.mark.parametrize("poll", [False, True])
+def test_watch(WORKING_DIR, poll):
+    """
+    Test functionality of the watchers and the query via socket.
+    """
+
+    this_working_dir = WORKING_DIR / f"test_watch_{poll}"
+    this_working_dir.mkdir(parents=True, exist_ok=False)
+    socket_path = WORKING_DIR / f"test_watch_{poll}.sock"
+
+    # write test-files
+    (this_working_dir / "test.txt").write_bytes(b"test1")
+
+    index = watch.DuplicateIndex(this_working_dir)
+    if poll:
+        watcher = watch.PollingWatcher(index, 0.05)
+    else:
+        watcher = watch.InotifyWatcher(index)
+    index.rescan()
+
+    stop = Event()
+    threads = [Thread(target=watcher.run, args=(stop,))]
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(str(socket_path))
+        server.listen()
+        threads.append(Thread(target=watch.serve, args=(index, server, stop)))
+        for thread in threads:
+            thread.start()
+        try:
+            assert watch.query_socket(socket_path) == ""
+
+            (this_working_dir / "sub").mkdir()
+            (this_working_dir / "sub" / "test_.txt").write_bytes(b"test1")
+            for _ in range(100):
+                if index.groups():
+                    break
+                sleep(0.05)
+
+            assert watch.query_socket(socket_path) == "\n".join([
+                str(this_working_dir / "sub" / "test_.txt"),
+                str(this_working_dir / "test.txt"),
+            ])
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+            watcher.close()
+
+
+def test_list_files(WORKING_DIR):
+    """
+    Test functionality of function `list_files`.
+    """
+
+    this_working_dir = WORKING_DIR / "test_list_files"
+    (this_working_dir / ".git" / "objects").mkdir(parents=True, exist_ok=False)
+    (this_working_dir / "sub").mkdir(parents=True, exist_ok=False)
+
+    # write test-files
+    (this_working_dir / ".git" / "objects" / "test.txt").write_bytes(b"test1")
+    (this_working_dir / "sub" / "test.txt").write_bytes(b"test1")
+    (this_working_dir / "sub" / "test.tmp").write_bytes(b"test1")
+    (this_working_dir / "empty.txt").write_bytes(b"")
+    (this_working_dir / "large.txt").write_bytes(b"test1"*100)
+
+    def list_files(**kwargs):
+        return sorted(
+            p.relative_to(this_working_dir).as_posix()
+            for p in src.list_files(this_working_dir, **kwargs)
+        )
+
+    assert list_files() == [
+        ".git/objects/test.txt", "empty.txt", "large.txt", "sub/test.tmp",
+        "sub/test.txt"
+    ]
+    assert list_files(exclude=[".git", "*.tmp"]) == [
+        "empty.txt", "large.txt", "sub/test.txt"
+    ]
+    assert list_files(exclude=["sub/*"], include=["*.txt"]) == [
+        ".git/objects/test.txt", "empty.txt", "large.txt"
+    ]
+    assert list_files(skip_empty=True, max_size=10, exclude=[".git"]) == [
+        "sub/test.tmp", "sub/test.txt"
+    ]
+    assert list_files(min_size=10) == ["large.txt"]
+
+
+def test_analyze_filters(WORKING_DIR):
+    """
+    Test functionality of the cli command `analyze` with filters.
+    """
+
+    this_working_dir = WORKING_DIR / "test_analyze_filters"
+    (this_working_dir / "skip").mkdir(parents=True, exist_ok=False)
+
+    # write test-files
+    (this_working_dir / "test.txt").write_bytes(b"test1")
+    (this_working_dir / "skip" / "test_.txt").write_bytes(b"test1")
+    (this_working_dir / "empty.txt").write_bytes(b"")
+    (this_working_dir / "empty_.txt").write_bytes(b"")
+
+    runner = CliRunner()
+    result = runner.invoke(
+        analyze.analyze,
+        ["-i", str(this_working_dir), "--exclude", "skip", "--skip-empty"]
+    )
+
+    assert result.exit_code == 0
+    assert result.output.strip() == str(this_working_dir / "test.txt")
+
+
+def test_cli_lazy_subcommands():
+    """
+    Test that the help-texts of the lazily loaded subcommands match the
+    actual commands.
+    """
+
+    ctx = click.Context(cli.cli)
+    for name, (_, help_text) in cli.cli.lazy_subcommands.items():
+        command = cli.cli.get_command(ctx, name)
+        assert command.name == name
+        assert command.get_short_help_str(1000) \
+            == click.Command(name, help=help_text).get_short_help_str(1000)
+
+
+def test_cli_startup():
+    """
+    Guard for the cli's startup time; make sure that invoking the cli with
+    '-h' does not import subcommand modules or heavy dependencies. (No
+    timings are measured or asserted.)
+    """
+
+    result = subprocess.run(
+        [
+            sys.executable, "-c",
+            "import sys\n"
+            + "from uniquipy.cli import cli\n"
+            + "try:\n"
+            + "    cli(['-h'])\n"
+            + "except SystemExit:\n"
+            + "    pass\n"
+            + "print('\\n'.join(sys.modules), file=sys.stderr)"
+        ],
+        capture_output=True,
+        check=True,
+        text=True
+    )
+
+    modules = result.stderr.split("\n")
+    for module in [
+        "uniquipy.analyze", "uniquipy.pack", "uniquipy.src",
+        "hashlib", "importlib.metadata", "concurrent.futures"
+    ]:
+        assert module not in modules
+
+
+def test_unpack_unavailable_compression(WORKING_DIR, monkeypatch):
+    """
+    Test that the cli commands `unpack` and `extract` fail cleanly if the
+    compression method of an archive is not available.
+    """
+
+    this_working_dir_in = WORKING_DIR / "test_unavailable_compression"
+    this_working_dir_intermediate = WORKING_DIR / "test_unavailable_compression_packed"
+    this_working_dir_out = WORKING_DIR / "test_unavailable_compression_out"
+    this_working_dir_in.mkdir(parents=True, exist_ok=False)
+
+    # write test-files
+    (this_working_dir_in / "test.txt").write_bytes(b"test1"*1000)
+
+    runner = CliRunner()
+    result = runner.invoke(
+        pack.pack,
+        [
+            "-i", str(this_working_dir_in),
+            "-o", str(this_working_dir_intermediate),
+            "-c", "gzip"
+        ]
+    )
+
+    assert result.exit_code == 0
+
+    # simulate archive generated in an environment with zstd
+    manifest_file = this_working_dir_intermediate / "manifest.json"
+    manifest = json.loads(manifest_file.read_text(encoding="utf-8"))
+    manifest["blobs"]["test.txt"]["compression"] = "zstd"
+    manifest_file.write_text(json.dumps(manifest), encoding="utf-8")
+    monkeypatch.setattr(compress, "ZSTD_AVAILABLE", False)
+
+    for command, args in [
+        (pack.unpack, []), (pack.extract, ["-p", "test.txt"])
+    ]:
+        result = runner.invoke(
+            command,
+            [
+                "-i", str(this_working_dir_intermediate),
+                "-o", str(this_working_dir_out),
+                "-v"
+            ] + args
+        )
+
+        assert result.exit_code == 1
+        assert "Error: Compression method 'zstd'" in result.output
+        assert not this_working_dir_out.exists()
+
+
+@pytest.mark.parametrize("container", [False, True])
+def test_unpack_permissions(WORKING_DIR, container):
+    """
+    Test that the cli commands `pack`, `unpack`, and `extract` preserve
+    permission bits.
+    """
+
+    this_working_dir_in = WORKING_DIR / f"test_permissions_{container}"
+    this_working_dir_intermediate = WORKING_DIR / f"test_permissions_{container}_packed"
+    this_working_dir_out = WORKING_DIR / f"test_permissions_{container}_unpacked"
+    this_working_dir_extracted = WORKING_DIR / f"test_permissions_{container}_extracted"
+    this_working_dir_in.mkdir(parents=True, exist_ok=False)
+
+    # write test-files
+    (this_working_dir_in / "script.sh").write_bytes(b"test1")
+    (this_working_dir_in / "script.sh").chmod(0o755)
+    (this_working_dir_in / "script_.sh").write_bytes(b"test1")
+    (this_working_dir_in / "script_.sh").chmod(0o600)
+
+    runner = CliRunner()
+    result = runner.invoke(
+        pack.pack,
+        ["-i", str(this_working_dir_in), "-o", str(this_working_dir_intermediate)]
+        + (["--container"] if container else [])
+    )
+
+    assert result.exit_code == 0
+
+    result = runner.invoke(
+        pack.unpack,
+        ["-i", str(this_working_dir_intermediate), "-o", str(this_working_dir_out)]
+    )
+
+    assert result.exit_code == 0
+    assert (this_working_dir_out / "script.sh").stat().st_mode & 0o777 == 0o755
+    assert (this_working_dir_out / "script_.sh").stat().st_mode & 0o777 == 0o600
+
+    result = runner.invoke(
+        pack.extract,
+        [
+            "-i", str(this_working_dir_intermediate),
+            "-p", "script.sh",
+            "-o", str(this_working_dir_extracted)
+        ]
+    )
+
+    assert result.exit_code == 0
+    assert (this_working_dir_extracted / "script.sh").stat().st_mode & 0o777 == 0o755
+
+
+def test_archive_reader_abstract():
+    """
+    Test that incomplete implementations of `ArchiveReader` cannot be
+    instantiated.
+    """
+
+    class IncompleteReader(archive.ArchiveReader):
+        def stored_size(self, name):
+            return None
+
+    with pytest.raises(TypeError):
+        IncompleteReader()
+
+
+def test_verify_unavailable_compression(WORKING_DIR, monkeypatch):
+    """
+    Test that the cli command `verify` does not report blobs as damaged if
+    their compression method is not available.
+    """
+
+    this_working_dir_in = WORKING_DIR / "test_verify_unavailable"
+    this_working_dir_out = WORKING_DIR / "test_verify_unavailable_packed"
+    this_working_dir_in.mkdir(parents=True, exist_ok=False)
+
+    # write test-files
+    (this_working_dir_in / "test.txt").write_bytes(b"test1"*1000)
+
+    runner = CliRunner()
+    result = runner.invoke(
+        pack.pack,
+        ["-i", str(this_working_dir_in), "-o", str(this_working_dir_out), "-c", "gzip"]
+    )
+
+    assert result.exit_code == 0
+
+    # simulate archive generated in an environment with zstd
+    manifest_file = this_working_dir_out / "manifest.json"
+    manifest = json.loads(manifest_file.read_text(encoding="utf-8"))
+    manifest["blobs"]["test.txt"]["compression"] = "zstd"
+    manifest_file.write_text(json.dumps(manifest), encoding="utf-8")
+    monkeypatch.setattr(compress, "ZSTD_AVAILABLE", False)
+
+    result = runner.invoke(
+        verify.verify, ["-i", str(this_working_dir_out)]
+    )
+
+    assert result.exit_code == 2
+    assert result.output.strip() \
+        == "unchecked: test.txt (compression method 'zstd' is not available)"
+
+
+def test_dedupe_symlinks(WORKING_DIR):
+    """
+    Test that the cli command `dedupe` does not delete the target of
+    symbolic links.
+    """
+
+    this_working_dir = WORKING_DIR / "test_dedupe_symlinks"
+    this_working_dir.mkdir(parents=True, exist_ok=False)
+
+    # write test-files
+    (this_working_dir / "a_target").write_bytes(b"test1")
+    (this_working_dir / "0link").symlink_to("a_target")
+    (this_working_dir / "b_link").symlink_to("a_target")
+
+    runner = CliRunner()
+    result = runner.invoke(
+        dedupe.dedupe, ["-i", str(this_working_dir), "--mode", "delete"]
+    )
+
+    assert result.exit_code == 0
+    assert (this_working_dir / "a_target").read_bytes() == b"test1"
+    assert (this_working_dir / "0link").read_bytes() == b"test1"
+    assert (this_working_dir / "b_link").read_bytes() == b"test1"
+
+    # direct call
+    for mode in dedupe.DEDUPE_MODES:
+        assert dedupe.replace_duplicate(
+            this_working_dir / "0link", this_working_dir / "a_target", mode
+        ) == "symbolic link"
+    assert (this_working_dir / "a_target").read_bytes() == b"test1"
+
+
+def test_replace_duplicate_metadata(WORKING_DIR, monkeypatch):
+    """
+    Test that function `replace_duplicate` keeps the metadata of duplicates
+    replaced by reflinks and does not remove foreign temporary files.
+    """
+
+    this_working_dir = WORKING_DIR / "test_replace_duplicate_metadata"
+    this_working_dir.mkdir(parents=True, exist_ok=False)
+
+    # write test-files
+    (this_working_dir / "test.txt").write_bytes(b"test1")
+    (this_working_dir / "test.txt").chmod(0o644)
+    (this_working_dir / "test_.txt").write_bytes(b"test1")
+    (this_working_dir / "test_.txt").chmod(0o600)
+    os.utime(this_working_dir / "test_.txt", (1000000000, 1000000000))
+
+    # simulate filesystem with reflink-support
+    monkeypatch.setattr(
+        dedupe, "reflink", lambda source, destination: copyfile(source, destination)
+    )
+    assert dedupe.replace_duplicate(
+        this_working_dir / "test.txt", this_working_dir / "test_.txt", "reflink"
+    ) is None
+
+    stat = (this_working_dir / "test_.txt").stat()
+    assert stat.st_mode & 0o777 == 0o600
+    assert stat.st_mtime == 1000000000
+    assert (this_working_dir / "test_.txt").read_bytes() == b"test1"
+
+    # pre-existing temporary file
+    (this_working_dir / ".test_.txt.uniquipy-tmp").write_bytes(b"test2")
+    assert dedupe.replace_duplicate(
+        this_working_dir / "test.txt", this_working_dir / "test_.txt", "hardlink"
+    ) is not None
+    assert (this_working_dir / ".test_.txt.uniquipy-tmp").read_bytes() == b"test2"
+
+
+def test_list_files_errors(WORKING_DIR, monkeypatch):
+    """
+    Test that function `list_files` skips directories that cannot be read.
+    """
+
+    this_working_dir = WORKING_DIR / "test_list_files_errors"
+    (this_working_dir / "locked").mkdir(parents=True, exist_ok=False)
+    (this_working_dir / "vanished").mkdir(parents=True, exist_ok=False)
+
+    # write test-files
+    (this_working_dir / "test.txt").write_bytes(b"test1")
+    (this_working_dir / "locked" / "test.txt").write_bytes(b"test1")
+    (this_working_dir / "vanished" / "test.txt").write_bytes(b"test1")
+
+    # simulate unreadable and concurrently removed directories
+    scandir = os.scandir
+
+    def faulty_scandir(path):
+        if Path(path).name == "locked":
+            raise PermissionError(13, "Permission denied", str(path))
+        if Path(path).name == "vanished":
+            raise FileNotFoundError(2, "No such file or directory", str(path))
+        return scandir(path)
+
+    monkeypatch.setattr(src.os, "scandir", faulty_scandir)
+
+    assert src.list_files(this_working_dir) == [this_working_dir / "test.txt"]
+
+
+def test_unpack_missing_manifest(WORKING_DIR):
+    """
+    Test that compressed archives are rejected if the manifest is missing.
+    """
+
+    this_working_dir_in = WORKING_DIR / "test_missing_manifest"
+    this_working_dir_intermediate = WORKING_DIR / "test_missing_manifest_packed"
+    this_working_dir_out = WORKING_DIR / "test_missing_manifest_out"
+    this_working_dir_in.mkdir(parents=True, exist_ok=False)
+
+    # write test-files
+    (this_working_dir_in / "test.txt").write_bytes(b"test1"*1000)
+
+    runner = CliRunner()
+    result = runner.invoke(
+        pack.pack,
+        [
+            "-i", str(this_working_dir_in),
+            "-o", str(this_working_dir_intermediate),
+            "-c", "gzip"
+        ]
+    )
+
+    assert result.exit_code == 0
+
+    (this_working_dir_intermediate / "manifest.json").unlink()
+
+    with pytest.raises(ValueError):
+        archive.open_archive(this_working_dir_intermediate)
+
+    result = runner.invoke(
+        pack.unpack,
+        ["-i", str(this_working_dir_intermediate), "-o", str(this_working_dir_out)]
+    )
+
+    assert result.exit_code == 1
+    assert not this_working_dir_out.exists()
+
+
+def test_container_writer(WORKING_DIR, monkeypatch):
+    """
+    Test that `ContainerWriter` buffers only compressed blobs.
+    """
+
+    this_working_dir = WORKING_DIR / "test_container_writer"
+    this_working_dir.mkdir(parents=True, exist_ok=False)
+    container = this_working_dir / "test.uniquipy"
+
+    # write test-files
+    random_data = os.urandom(10000)
+    (this_working_dir / "test.txt").write_bytes(b"test1"*1000)
+    (this_working_dir / "test.bin").write_bytes(random_data)
+
+    buffered = []
+    spooled_temporary_file = archive.SpooledTemporaryFile
+    monkeypatch.setattr(
+        archive,
+        "SpooledTemporaryFile",
+        lambda *args, **kwargs: \
+            buffered.append(True) or spooled_temporary_file(*args, **kwargs)
+    )
+
+    with archive.ContainerWriter(container) as writer:
+        writer.add_blob("test.bin", this_working_dir / "test.bin", "gzip")
+        writer.add_blob("test.txt", this_working_dir / "test.txt", "gzip")
+        writer.add_blob("test_.txt", this_working_dir / "test.txt")
+        writer.close({"groups": [["test.bin"], ["test.txt"], ["test_.txt"]]})
+
+    assert len(buffered) == 1
+
+    with archive.open_archive(container) as reader:
+        assert reader.compression("test.bin") is None
+        assert reader.compression("test.txt") == "gzip"
+        assert reader.compression("test_.txt") is None
+        for name in ["test.bin", "test.txt", "test_.txt"]:
+            assert verify.verify_blob(reader, name) is None
+            assert verify.verify_blob(reader, name, fast=True) is None
+        with reader.open_blob("test.bin") as stream:
+            assert stream.read() == random_data
+
+
+def test_verify_without_digest(WORKING_DIR):
+    """
+    Test that the cli command `verify` reports files without recorded digest
+    as unchecked.
+    """
+
+    this_working_dir_in = WORKING_DIR / "test_verify_without_digest"
+    this_working_dir_out = WORKING_DIR / "test_verify_without_digest_packed"
+    this_working_dir_in.mkdir(parents=True, exist_ok=False)
+
+    # write test-files
+    (this_working_dir_in / "test.txt").write_bytes(b"test1")
+    (this_working_dir_in / "test2.txt").write_bytes(b"test2")
+
+    runner = CliRunner()
+    result = runner.invoke(
+        pack.pack,
+        ["-i", str(this_working_dir_in), "-o", str(this_working_dir_out)]
+    )
+
+    assert result.exit_code == 0
+
+    # simulate archive generated with an older version
+    (this_working_dir_out / "manifest.json").unlink()
+
+    for fast in [False, True]:
+        result = runner.invoke(
+            verify.verify,
+            ["-i", str(this_working_dir_out), "-v"] + (["--fast"] if fast else [])
+        )
+
+        assert result.exit_code == 2
+        assert "archive is intact" not in result.output
+        assert "number of checked files: 0" in result.output
+        assert "test.txt (unchecked: no digest recorded)" in result.output
+
+
+def test_watch_serve_errors(WORKING_DIR, monkeypatch):
+    """
+    Test that the query via socket keeps working after failed requests.
+    """
+
+    this_working_dir = WORKING_DIR / "test_watch_serve_errors"
+    this_working_dir.mkdir(parents=True, exist_ok=False)
+    socket_path = WORKING_DIR / "test_watch_serve_errors.sock"
+
+    # write test-files
+    (this_working_dir / "test.txt").write_bytes(b"test1")
+    (this_working_dir / "test_.txt").write_bytes(b"test1")
+
+    index = watch.DuplicateIndex(this_working_dir)
+    index.rescan()
+
+    # first request: client disconnects before the response is sent;
+    # second request: evaluation of the index fails
+    disconnected = Event()
+    requests = []
+    groups = index.groups
+
+    def faulty_groups():
+        requests.append(True)
+        if len(requests) == 1:
+            disconnected.wait(5)
+        if len(requests) == 2:
+            raise FileNotFoundError(2, "No such file or directory")
+        return groups()
+
+    monkeypatch.setattr(index, "groups", faulty_groups)
+
+    stop = Event()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(str(socket_path))
+        server.listen()
+        thread = Thread(target=watch.serve, args=(index, server, stop))
+        thread.start()
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                client.connect(str(socket_path))
+            disconnected.set()
+
+            assert watch.query_socket(socket_path, 5) == ""
+            assert watch.query_socket(socket_path, 5) == "\n".join([
+                str(this_working_dir / "test.txt"),
+                str(this_working_dir / "test_.txt"),
+            ])
+            assert thread.is_alive()
+        finally:
+            stop.set()
+            thread.join()
+
+    # unresponsive watch-process
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        socket_path.unlink()
+        server.bind(str(socket_path))
+        server.listen()
+
+        result = CliRunner().invoke(
+            watch.query, ["-s", str(socket_path), "-t", "0.1", "-v"]
+        )
+
+        assert result.exit_code == 1
+        assert "Error: Unable to query socket" in result.output
+
+
+def test_watch_inotify_limit(WORKING_DIR, monkeypatch):
+    """
+    Test that `InotifyWatcher` reports directories that cannot be watched.
+    """
+
+    this_working_dir = WORKING_DIR / "test_watch_inotify_limit"
+    this_working_dir.mkdir(parents=True, exist_ok=False)
+
+    # write test-files
+    (this_working_dir / "test.txt").write_bytes(b"test1")
+
+    # simulate limit of watches
+    libc = ctypes.CDLL(
+        ctypes.util.find_library("c") or "libc.so.6", use_errno=True
+    )
+    limit = []
+
+    class LimitedLibc:
+        def __getattr__(self, name):
+            return getattr(libc, name)
+
+        def inotify_add_watch(self, *args):
+            if len(limit) == 0:
+                ctypes.set_errno(errno.ENOSPC)
+                return -1
+            limit.pop()
+            return libc.inotify_add_watch(*args)
+
+    monkeypatch.setattr(
+        watch.ctypes, "CDLL", lambda *args, **kwargs: LimitedLibc()
+    )
+
+    index = watch.DuplicateIndex(this_working_dir)
+    with pytest.raises(OSError) as exc_info:
+        watch.InotifyWatcher(index)
+    assert exc_info.value.errno == errno.ENOSPC
+
+    # subdirectories created later on are rescanned periodically
+    limit.append(True)
+    warnings = []
+    watcher = watch.InotifyWatcher(index, 0.05, warnings.append)
+    index.rescan()
+
+    stop = Event()
+    thread = Thread(target=watcher.run, args=(stop,))
+    thread.start()
+    try:
+        (this_working_dir / "sub").mkdir()
+        for _ in range(100):
+            if warnings:
+                break
+            sleep(0.05)
+
+        assert len(warnings) == 1
+
+        sleep(0.1)
+        (this_working_dir / "sub" / "test_.txt").write_bytes(b"test1")
+        for _ in range(100):
+            if index.groups():
+                break
+            sleep(0.05)
+
+        assert index.groups() == [
+            [this_working_dir / "sub" / "test_.txt", this_working_dir / "test.txt"]
+        ]
+    finally:
+        stop.set()
+        thread.join()
+        watcher.close()
+
+
+def test_duplicate_index_concurrent(WORKING_DIR, monkeypatch):
+    """
+    Test that `DuplicateIndex` can be updated while files are hashed.
+    """
+
+    this_working_dir = WORKING_DIR / "test_duplicate_index_concurrent"
+    this_working_dir.mkdir(parents=True, exist_ok=False)
+
+    # write test-files
+    (this_working_dir / "test.txt").write_bytes(b"test1")
+    (this_working_dir / "test_.txt").write_bytes(b"test1")
+
+    index = watch.DuplicateIndex(this_working_dir)
+    index.rescan()
+
+    # block hashing until released
+    hashing, release = Event(), Event()
+    hash_from_file = src.hash_from_file
+
+    def blocking_hash_from_file(*args):
+        hashing.set()
+        release.wait(5)
+        return hash_from_file(*args)
+
+    monkeypatch.setattr(src, "hash_from_file", blocking_hash_from_file)
+
+    results = []
+    thread = Thread(target=lambda: results.append(index.groups()))
+    thread.start()
+    try:
+        assert hashing.wait(5)
+
+        (this_working_dir / "test2.txt").write_bytes(b"test1")
+        updated = Thread(
+            target=index.update, args=(this_working_dir / "test2.txt",)
+        )
+        updated.start()
+        updated.join(1)
+
+        assert not updated.is_alive()
+    finally:
+        release.set()
+        thread.join()
+
+    # outdated result is not cached
+    assert results == [
+        [[this_working_dir / "test.txt", this_working_dir / "test_.txt"]]
+    ]
+    assert index.groups() == [[
+        this_working_dir / "test.txt",
+        this_working_dir / "test2.txt",
+        this_working_dir / "test_.txt",
+    ]]
@@ -7,6 +7,7 @@ from pathlib import Path
 import click
 from uniquipy import src
 from uniquipy.src import HASHING_ALGORITHMS as methods
+from uniquipy.options import filter_options
 
 
 @click.command()
@@ -26,6 +27,7 @@ from uniquipy.src import HASHING_ALGORITHMS as methods
     ),
     help="specify the hash algorithm used to identify files"
 )
+@filter_options
 @click.option(
     "-v", "--verbose", "verbose",
     is_flag=True,
@@ -34,6 +36,11 @@ from uniquipy.src import HASHING_ALGORITHMS as methods
 def analyze(
     input_dir,
     hash_algorithm,
+    min_size,
+    max_size,
+    include,
+    exclude,
+    skip_empty,
     verbose
 ):
     """Analyze existing directory regarding file duplicates."""
@@ -53,7 +60,14 @@ def analyze(
         click.echo("analyzing..")
 
     # find all files
-    list_of_files = [p for p in source.glob("**/*") if p.is_file()]
+    list_of_files = src.list_files(
+        source,
+        min_size=min_size,
+        max_size=max_size,
+        include=include,
+        exclude=exclude,
+        skip_empty=skip_empty
+    )
 
     if verbose:
         click.echo(f"working on a set of {len(list_of_files)} files")
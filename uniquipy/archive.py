@@ -0,0 +1,528 @@
+"""
+This module contains definitions for reading and writing archives generated
+by the pack-command.
+
+Two archive formats are supported:
+* directory: a directory containing the files 'index.txt' (groups of
+  identical files separated by empty lines; the first file of every group is
+  stored), 'manifest.json' (metadata of stored files; required if the
+  stored files have been compressed, see 'readme.txt'), and 'readme.txt' as
+  well as the directory 'data/' (stored files)
+* container: a single file of the layout
+  - header: `CONTAINER_MAGIC` and format version (2 bytes)
+  - data: concatenated stored files
+  - index: utf-8 encoded json (metadata, groups of identical files, and
+    offsets of stored files)
+  - footer: offset and size of the index (8 bytes each) and
+    `CONTAINER_MAGIC`
+"""
+
+from typing import Optional, BinaryIO
+from abc import ABC, abstractmethod
+from pathlib import Path
+from shutil import copyfileobj
+from contextlib import ExitStack
+from tempfile import SpooledTemporaryFile
+from threading import Lock
+import io
+import os
+import re
+import stat
+import json
+import struct
+from uniquipy import compress
+from uniquipy.src import HASHING_ALGORITHMS, hash_from_samples
+
+
+data_dir_name = "data"
+index_file_name = "index.txt"
+manifest_file_name = "manifest.json"
+readme_file_name = "readme.txt"
+chunk_size = 1048576
+
+CONTAINER_MAGIC = b"UNIQUIPY"
+CONTAINER_VERSION = 1
+_header = struct.Struct(f">{len(CONTAINER_MAGIC)}sH")
+_footer = struct.Struct(f">QQ{len(CONTAINER_MAGIC)}s")
+_pread_lock = Lock()
+
+
+def _pread(fd: int, n: int, offset: int) -> bytes:
+    """
+    Returns up to `n` bytes read at `offset` of the file with descriptor
+    `fd` (without altering the file position if `os.pread` is available).
+    """
+
+    if hasattr(os, "pread"):
+        return os.pread(fd, n, offset)
+    with _pread_lock:
+        os.lseek(fd, offset, os.SEEK_SET)
+        return os.read(fd, n)
+
+
+class _HashingReader(io.RawIOBase):
+    """
+    Readable file object that updates a hash with the data read from the
+    wrapped stream.
+    """
+
+    def __init__(self, stream: BinaryIO, hashed) -> None:
+        self._stream = stream
+        self.hashed = hashed
+        self.size = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self._stream.read(len(buffer))
+        buffer[:len(data)] = data
+        self.hashed.update(data)
+        self.size += len(data)
+        return len(data)
+
+
+class BlobReader(io.RawIOBase):
+    """
+    Readable and seekable file object for the section of `size` bytes at
+    `offset` of the file with descriptor `fd`. Data is accessed via
+    positioned reads, i.e., multiple readers can share a descriptor.
+    """
+
+    def __init__(self, fd: int, offset: int, size: int) -> None:
+        self._fd = fd
+        self._offset = offset
+        self._size = size
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset = self._position + offset
+        elif whence == io.SEEK_END:
+            offset = self._size + offset
+        self._position = max(0, min(offset, self._size))
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        n = min(len(buffer), self._size - self._position)
+        if n <= 0:
+            return 0
+        data = _pread(self._fd, n, self._offset + self._position)
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+
+def store_blob(
+    file: Path,
+    stream: BinaryIO,
+    compression: Optional[str] = None,
+    hash_algorithm: str = "md5"
+) -> dict:
+    """
+    Writes the contents of `file` to `stream` and returns a dict of metadata
+    with the keys
+    - `compression`: the compression method that has been applied (`None` if
+                     the file has been stored as is),
+    - `size`: the original file size,
+    - `digest`: the hash of the original file contents,
+    - `stored_size`: the size of the data written to `stream`, and
+    - `sample_digest`: the hash of blocks sampled from the data written to
+                       `stream` (see `hash_from_samples`).
+
+    Keyword arguments:
+    file -- path to the source file
+    stream -- readable, writable, and seekable binary file object
+    compression -- string identifier for compression method
+                   (see definition of `COMPRESSION_METHODS`)
+                   (default None)
+    hash_algorithm -- string identifier for the hashing algorithm used
+                      (see definition of `HASHING_ALGORITHMS`)
+                      (default 'md5')
+    """
+
+    if compression is not None and not compress.is_compressible(file):
+        compression = None
+
+    start = stream.tell()
+    with open(file, "rb") as f_in:
+        reader = _HashingReader(f_in, HASHING_ALGORITHMS[hash_algorithm]())
+        if compression is None:
+            copyfileobj(reader, stream, chunk_size)
+        else:
+            with compress.compressor(compression, stream) as f_compressed:
+                copyfileobj(reader, f_compressed, chunk_size)
+    end = stream.tell()
+
+    blob = {
+        "compression": compression,
+        "size": reader.size,
+        "digest": reader.hashed.hexdigest(),
+        "stored_size": end - start,
+        "sample_digest": hash_from_samples(
+            hash_algorithm, stream, end - start, start
+        ),
+    }
+    stream.seek(end)
+    return blob
+
+
+def _fan_out(stream: BinaryIO, destinations: list[Path]) -> None:
+    """
+    Writes the data read from `stream` to all `destinations` (every chunk is
+    read only once).
+    """
+
+    with ExitStack() as stack:
+        files = [
+            stack.enter_context(open(destination, "wb"))
+            for destination in destinations
+        ]
+        while (data := stream.read(chunk_size)):
+            for file in files:
+                file.write(data)
+
+
+def restore_blob(
+    stream: BinaryIO,
+    destinations: list[Path],
+    compression: Optional[str] = None,
+    max_open_files: int = 64
+) -> None:
+    """
+    Restores the original file from `stream` at all `destinations` (see
+    `store_blob`). The stored data is read (and decompressed) only once and
+    in chunks.
+
+    Keyword arguments:
+    stream -- readable binary file object
+    destinations -- paths to the target files
+    compression -- string identifier for compression method that has been
+                   applied to the stored data
+                   (default None)
+    max_open_files -- maximum number of target files that are written
+                      simultaneously; further copies are made from the first
+                      target file
+                      (default 64)
+    """
+
+    with ExitStack() as stack:
+        if compression is not None:
+            stream = stack.enter_context(
+                compress.decompressor(compression, stream)
+            )
+        _fan_out(stream, destinations[:max_open_files])
+
+    for i in range(max_open_files, len(destinations), max_open_files):
+        with open(destinations[0], "rb") as first:
+            _fan_out(first, destinations[i:i + max_open_files])
+
+
+class ContainerWriter:
+    """
+    Writer for the container format. Blobs can be added concurrently from
+    multiple threads; the index is written on `close`.
+
+    Keyword arguments:
+    path -- path to the container file (must not exist)
+    hash_algorithm -- string identifier for the hashing algorithm used
+                      (see definition of `HASHING_ALGORITHMS`)
+                      (default 'md5')
+    """
+
+    def __init__(self, path: Path, hash_algorithm: str = "md5") -> None:
+        self.path = path
+        self.hash_algorithm = hash_algorithm
+        self.blobs = {}
+        self._lock = Lock()
+        # readable for sampling blobs that are written directly
+        self._file = open(path, "x+b")
+        self._file.write(_header.pack(CONTAINER_MAGIC, CONTAINER_VERSION))
+
+    def add_blob(
+        self,
+        name: str,
+        file: Path,
+        compression: Optional[str] = None
+    ) -> dict:
+        """
+        Stores `file` as `name` in the container and returns the
+        corresponding entry of the index (see `store_blob`).
+
+        Keyword arguments:
+        name -- identifier of the blob
+        file -- path to the source file
+        compression -- string identifier for compression method
+                       (see definition of `COMPRESSION_METHODS`)
+                       (default None)
+        """
+
+        if compression is not None and not compress.is_compressible(file):
+            compression = None
+
+        # data that is stored as is can be written to the container directly
+        if compression is None:
+            with self._lock:
+                offset = self._file.tell()
+                blob = store_blob(file, self._file, None, self.hash_algorithm)
+                blob["offset"] = offset
+                self.blobs[name] = blob
+            return blob
+
+        # compress in parallel to other blobs, buffer result before
+        # appending to the container
+        with SpooledTemporaryFile(max_size=16*chunk_size) as buffer:
+            blob = store_blob(file, buffer, compression, self.hash_algorithm)
+            buffer.seek(0)
+            with self._lock:
+                blob["offset"] = self._file.tell()
+                copyfileobj(buffer, self._file, chunk_size)
+                self.blobs[name] = blob
+        return blob
+
+    def close(self, metadata: Optional[dict] = None) -> None:
+        """
+        Writes index and footer and closes the container.
+
+        Keyword arguments:
+        metadata -- dict that is written to the index along with the blob
+                    information (should contain the key 'groups')
+                    (default None)
+        """
+
+        index = json.dumps(
+            (metadata or {}) | {
+                "hash_algorithm": self.hash_algorithm,
+                "blobs": self.blobs
+            }
+        ).encode("utf-8")
+        offset = self._file.tell()
+        self._file.write(index)
+        self._file.write(_footer.pack(offset, len(index), CONTAINER_MAGIC))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            # remove incomplete container
+            self._file.close()
+            self.path.unlink(missing_ok=True)
+        elif not self._file.closed:
+            self.close()
+
+
+class ArchiveReader(ABC):
+    """
+    Common interface for reading archives. The attribute `metadata` contains
+    the archive's metadata (including the keys 'groups' and 'blobs').
+    """
+
+    metadata: dict
+
+    @property
+    def groups(self) -> list[list[str]]:
+        """Returns list of groups of identical files."""
+        return self.metadata["groups"]
+
+    @property
+    def blobs(self) -> dict[str, dict]:
+        """Returns dict of blob-metadata keyed by blob identifier."""
+        return self.metadata["blobs"]
+
+    def find_group(self, path: str) -> Optional[list[str]]:
+        """
+        Returns the group of identical files `path` belongs to (`None` if
+        `path` is not part of the archive).
+        """
+
+        if not hasattr(self, "_lookup"):
+            self._lookup = {
+                file: group for group in self.groups for file in group
+            }
+        return self._lookup.get(path)
+
+    def compression(self, name: str) -> Optional[str]:
+        """Returns compression method of blob `name`."""
+        return self.blobs.get(name, {}).get("compression")
+
+    def mode(self, path: str) -> Optional[int]:
+        """
+        Returns permission bits of the original file `path` (`None` if
+        unknown).
+        """
+        return self.metadata.get("modes", {}).get(path)
+
+    @abstractmethod
+    def stored_size(self, name: str) -> Optional[int]:
+        """
+        Returns size of the stored data of `name` (`None` if missing).
+        """
+
+    @abstractmethod
+    def open_blob(self, name: str) -> BinaryIO:
+        """
+        Returns readable and seekable binary file object for stored data of
+        `name`.
+        """
+
+    def close(self) -> None:
+        """Closes the archive."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class DirectoryReader(ArchiveReader):
+    """
+    Reader for the directory format.
+
+    Keyword arguments:
+    path -- path to the archive directory
+    """
+
+    def __init__(self, path: Path) -> None:
+        if not (path / index_file_name).is_file() \
+                or not (path / data_dir_name).is_dir():
+            raise ValueError(
+                f"Bad archive format at '{path}' (expected '{index_file_name}' and '{data_dir_name}/')."
+            )
+        self.path = path
+
+        # archives generated with older versions come without manifest
+        if (path / manifest_file_name).is_file():
+            self.metadata = json.loads(
+                (path / manifest_file_name).read_text(encoding="utf-8")
+            )
+        else:
+            # compressed data cannot be restored without the manifest
+            compression = self._readme_compression()
+            if compression is not None:
+                raise ValueError(
+                    f"Bad archive format at '{path}' (data has been compressed using '{compression}' but '{manifest_file_name}' is missing)."
+                )
+            self.metadata = {"blobs": {}}
+
+        index = (path / index_file_name).read_text(encoding="utf-8")
+        self.metadata["groups"] = [
+            unique.split("\n") for unique in index.split("\n\n") if unique
+        ]
+
+    def _readme_compression(self) -> Optional[str]:
+        """
+        Returns compression method declared in the readme (`None` if not
+        declared).
+        """
+
+        try:
+            readme = (self.path / readme_file_name).read_text(encoding="utf-8")
+        except OSError:
+            return None
+        match = re.search(r"compressed using '([^']+)'", readme)
+        return match.group(1) if match else None
+
+    def mode(self, path: str) -> Optional[int]:
+        if "modes" in self.metadata:
+            return super().mode(path)
+        # archives generated with older versions store permission bits
+        # only with the stored file (see `shutil.copy`)
+        group = self.find_group(path)
+        if group is None or self.stored_size(group[0]) is None:
+            return None
+        blob = self.path / data_dir_name / group[0]
+        return stat.S_IMODE(blob.stat().st_mode)
+
+    def stored_size(self, name: str) -> Optional[int]:
+        blob = self.path / data_dir_name / name
+        if not blob.is_file():
+            return None
+        return blob.stat().st_size
+
+    def open_blob(self, name: str) -> BinaryIO:
+        return open(self.path / data_dir_name / name, "rb")
+
+
+class ContainerReader(ArchiveReader):
+    """
+    Reader for the container format. Only header, footer and index are read
+    on opening; blobs are accessed via positioned reads.
+
+    Keyword arguments:
+    path -- path to the container file
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._fd = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+        try:
+            size = os.fstat(self._fd).st_size
+            if size < _header.size + _footer.size:
+                raise ValueError(f"Bad container format at '{path}'.")
+            magic, version = _header.unpack(
+                _pread(self._fd, _header.size, 0)
+            )
+            offset, index_size, magic_footer = _footer.unpack(
+                _pread(self._fd, _footer.size, size - _footer.size)
+            )
+            if magic != CONTAINER_MAGIC or magic_footer != CONTAINER_MAGIC:
+                raise ValueError(f"Bad container format at '{path}'.")
+            if version > CONTAINER_VERSION:
+                raise ValueError(
+                    f"Unsupported container version {version} at '{path}'."
+                )
+            self.metadata = json.loads(
+                _pread(self._fd, index_size, offset).decode("utf-8")
+            )
+        except Exception:
+            os.close(self._fd)
+            raise
+
+    def stored_size(self, name: str) -> Optional[int]:
+        if name not in self.blobs:
+            return None
+        return self.blobs[name]["stored_size"]
+
+    def open_blob(self, name: str) -> BinaryIO:
+        blob = self.blobs[name]
+        return io.BufferedReader(
+            BlobReader(self._fd, blob["offset"], blob["stored_size"]),
+            buffer_size=chunk_size
+        )
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+def is_container(path: Path) -> bool:
+    """Returns `True` if `path` is a file in container format."""
+
+    if not path.is_file():
+        return False
+    with open(path, "rb") as file:
+        return file.read(len(CONTAINER_MAGIC)) == CONTAINER_MAGIC
+
+
+def open_archive(path: Path) -> ArchiveReader:
+    """
+    Returns reader for the archive at `path` (raises `ValueError` for bad
+    format).
+    """
+
+    if is_container(path):
+        return ContainerReader(path)
+    if path.is_dir():
+        return DirectoryReader(path)
+    raise ValueError(f"Bad archive format at '{path}'.")
@@ -2,17 +2,103 @@
 This module defines the cli's entry-point.
 """
 
+from importlib import import_module
 import click
-from uniquipy.analyze import analyze
-from uniquipy.pack import pack, unpack
 
-@click.group(context_settings={"help_option_names": ["-h", "--help"]})
+
+class LazyGroup(click.Group):
+    """
+    Group of commands where the modules defining the subcommands are only
+    imported when a subcommand is actually invoked. This keeps the startup
+    time of the cli short.
+
+    Keyword arguments:
+    lazy_subcommands -- dict of subcommand-name and tuple of import path
+                        ('<module>:<command>') and help-text (shortened and
+                        shown in the group's help without importing the
+                        module)
+                        (default None)
+    """
+
+    def __init__(self, *args, lazy_subcommands=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_subcommands = lazy_subcommands or {}
+
+    def list_commands(self, ctx):
+        return sorted(
+            super().list_commands(ctx) + list(self.lazy_subcommands.keys())
+        )
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name not in self.lazy_subcommands:
+            return super().get_command(ctx, cmd_name)
+        module, command = self.lazy_subcommands[cmd_name][0].split(":")
+        return getattr(import_module(module), command)
+
+    def format_commands(self, ctx, formatter):
+        commands = []
+        for cmd_name in self.list_commands(ctx):
+            if cmd_name in self.lazy_subcommands:
+                # use placeholder instead of importing the module
+                command = click.Command(
+                    cmd_name, help=self.lazy_subcommands[cmd_name][1]
+                )
+            else:
+                command = self.get_command(ctx, cmd_name)
+            if command is None or command.hidden:
+                continue
+            commands.append((cmd_name, command))
+
+        if commands:
+            # see click.Group.format_commands
+            limit = formatter.width - 6 - max(len(name) for name, _ in commands)
+            with formatter.section("Commands"):
+                formatter.write_dl([
+                    (name, command.get_short_help_str(limit))
+                    for name, command in commands
+                ])
+
+
+@click.group(
+    cls=LazyGroup,
+    lazy_subcommands={
+        "analyze": (
+            "uniquipy.analyze:analyze",
+            "Analyze existing directory regarding file duplicates."
+        ),
+        "dedupe": (
+            "uniquipy.dedupe:dedupe",
+            "Remove file duplicates in an existing directory in place."
+        ),
+        "extract": (
+            "uniquipy.pack:extract",
+            "Extract individual files from a previously packed directory."
+        ),
+        "pack": (
+            "uniquipy.pack:pack",
+            "Pack the files of an existing directory into a unique format regarding file duplicates."
+        ),
+        "query": (
+            "uniquipy.watch:query",
+            "Query the current groups of identical files from a running watch-command."
+        ),
+        "unpack": (
+            "uniquipy.pack:unpack",
+            "Unpack, i.e., reconstruct a previously packed directory at a given destination."
+        ),
+        "verify": (
+            "uniquipy.verify:verify",
+            "Verify the integrity of a previously packed directory."
+        ),
+        "watch": (
+            "uniquipy.watch:watch",
+            "Watch existing directory and keep track of file duplicates. The current groups of identical files can be requested with the query-command."
+        ),
+    },
+    context_settings={"help_option_names": ["-h", "--help"]}
+)
 def cli():
     """
     Command line tool for finding and handling file duplicates in a directory
     based on file hashes.
     """
-
-cli.add_command(analyze)
-cli.add_command(pack)
-cli.add_command(unpack)
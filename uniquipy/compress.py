@@ -0,0 +1,152 @@
+"""
+This module contains definitions for the (optional) compression of archived
+data.
+"""
+
+from typing import Optional, BinaryIO
+from pathlib import Path
+import gzip
+import lzma
+import zlib
+
+try:
+    # python>=3.14
+    from compression import zstd as _zstd_stdlib
+except ImportError:
+    _zstd_stdlib = None
+try:
+    import zstandard as _zstandard
+except ImportError:
+    _zstandard = None
+
+COMPRESSION_METHODS = ["zstd", "gzip", "lzma"]
+ZSTD_AVAILABLE = _zstd_stdlib is not None or _zstandard is not None
+
+# errors raised on decompressing bad data
+DECOMPRESSION_ERRORS = (gzip.BadGzipFile, zlib.error, lzma.LZMAError, EOFError) \
+    + ((_zstd_stdlib.ZstdError,) if _zstd_stdlib is not None else ()) \
+    + ((_zstandard.ZstdError,) if _zstandard is not None else ())
+
+# fallback if a method is requested that is not available in the current
+# environment
+FALLBACK_METHOD = "gzip"
+
+# suffixes of file formats that are already compressed
+COMPRESSED_SUFFIXES = {
+    ".7z", ".bz2", ".gz", ".tgz", ".xz", ".txz", ".lz", ".lz4", ".lzma",
+    ".rar", ".zip", ".zst", ".jar", ".whl", ".apk", ".docx", ".xlsx",
+    ".pptx", ".odt", ".ods", ".odp", ".epub",
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic", ".avif", ".jp2",
+    ".mp3", ".aac", ".ogg", ".opus", ".flac", ".m4a",
+    ".mp4", ".m4v", ".mkv", ".mov", ".avi", ".webm",
+}
+
+
+def is_available(method: str) -> bool:
+    """
+    Returns `True` if the compression method `method` can be used in the
+    current environment.
+
+    Keyword arguments:
+    method -- string identifier for compression method
+              (see definition of `COMPRESSION_METHODS`)
+    """
+
+    if method == "zstd":
+        return ZSTD_AVAILABLE
+    return method in COMPRESSION_METHODS
+
+
+def resolve_method(method: Optional[str]) -> Optional[str]:
+    """
+    Returns the compression method that is effectively used when requesting
+    `method`, i.e., `FALLBACK_METHOD` if `method` is not available.
+
+    Keyword arguments:
+    method -- string identifier for compression method
+              (see definition of `COMPRESSION_METHODS`)
+    """
+
+    if method is not None and not is_available(method):
+        return FALLBACK_METHOD
+    return method
+
+
+def is_compressible(
+    path: Path,
+    sample_size: int = 65536,
+    threshold: float = 0.95
+) -> bool:
+    """
+    Returns `False` if compressing the file at `path` is not expected to pay
+    off, either because of its suffix or because a sample of its contents
+    does not compress well.
+
+    Keyword arguments:
+    path -- path to the file
+    sample_size -- size of the sample that is compressed for testing
+                   (default 65536)
+    threshold -- maximum ratio of compressed and original sample size
+                 (default 0.95)
+    """
+
+    if path.suffix.lower() in COMPRESSED_SUFFIXES:
+        return False
+
+    with open(path, "rb") as file:
+        sample = file.read(sample_size)
+
+    if not sample:
+        return False
+
+    return len(zlib.compress(sample, 1)) < threshold * len(sample)
+
+
+def compressor(method: str, stream: BinaryIO) -> BinaryIO:
+    """
+    Returns writable file object which compresses the data written to it
+    into `stream`. Closing the returned object does not close `stream`.
+
+    Keyword arguments:
+    method -- string identifier for compression method
+              (see definition of `COMPRESSION_METHODS`)
+    stream -- writable binary file object
+    """
+
+    if method == "gzip":
+        return gzip.GzipFile(fileobj=stream, mode="wb", mtime=0)
+    if method == "lzma":
+        return lzma.LZMAFile(stream, mode="wb")
+    if method == "zstd":
+        if _zstd_stdlib is not None:
+            return _zstd_stdlib.ZstdFile(stream, mode="wb")
+        if _zstandard is not None:
+            return _zstandard.ZstdCompressor().stream_writer(
+                stream, closefd=False
+            )
+    raise ValueError(f"Unsupported compression method '{method}'.")
+
+
+def decompressor(method: str, stream: BinaryIO) -> BinaryIO:
+    """
+    Returns readable file object which decompresses the data read from
+    `stream` on the fly. Closing the returned object does not close `stream`.
+
+    Keyword arguments:
+    method -- string identifier for compression method
+              (see definition of `COMPRESSION_METHODS`)
+    stream -- readable binary file object
+    """
+
+    if method == "gzip":
+        return gzip.GzipFile(fileobj=stream, mode="rb")
+    if method == "lzma":
+        return lzma.LZMAFile(stream, mode="rb")
+    if method == "zstd":
+        if _zstd_stdlib is not None:
+            return _zstd_stdlib.ZstdFile(stream, mode="rb")
+        if _zstandard is not None:
+            return _zstandard.ZstdDecompressor().stream_reader(
+                stream, closefd=False
+            )
+    raise ValueError(f"Unsupported compression method '{method}'.")
@@ -0,0 +1,252 @@
+"""
+This module contains the definition of the dedupe-command.
+"""
+
+from typing import Optional
+import sys
+import os
+from pathlib import Path
+from shutil import copystat
+from filecmp import cmp
+import click
+from uniquipy import src
+from uniquipy.src import HASHING_ALGORITHMS as methods
+from uniquipy.options import filter_options
+
+
+DEDUPE_MODES = ["hardlink", "reflink", "delete"]
+
+# ioctl request code for cloning a file (linux/fs.h)
+FICLONE = 0x40049409
+
+
+def reflink(source: Path, destination: Path) -> None:
+    """
+    Creates `destination` as copy-on-write clone of `source` (raises
+    `OSError` if not supported by the platform or filesystem).
+
+    Keyword arguments:
+    source -- path to the existing file
+    destination -- path to the new file
+    """
+
+    try:
+        import fcntl
+    except ImportError as exc_info:
+        raise OSError("Reflinks are not supported on this platform.") \
+            from exc_info
+
+    with open(source, "rb") as f_in, open(destination, "xb") as f_out:
+        try:
+            fcntl.ioctl(f_out.fileno(), FICLONE, f_in.fileno())
+        except OSError:
+            f_out.close()
+            destination.unlink()
+            raise
+
+
+def replace_duplicate(
+    original: Path,
+    duplicate: Path,
+    mode: str,
+    compare: bool = True
+) -> Optional[str]:
+    """
+    Replaces `duplicate` by a link to `original` or deletes it (depending on
+    `mode`). Links are created under a temporary name first and then moved
+    to replace `duplicate` atomically. Symbolic links and hardlinks of
+    `original` are never touched. Returns a description of the problem if
+    `duplicate` has not been replaced (`None` on success or if nothing needs
+    to be done).
+
+    Keyword arguments:
+    original -- path to the file that is kept
+    duplicate -- path to the file that is replaced
+    mode -- one of `DEDUPE_MODES`
+    compare -- whether to compare the files byte by byte before replacing
+               (default True)
+    """
+
+    temporary = duplicate.parent / f".{duplicate.name}.uniquipy-tmp"
+    created = False
+    try:
+        # a symbolic link and its target are no duplicates
+        if original.is_symlink() or duplicate.is_symlink():
+            return "symbolic link"
+
+        # already linked, nothing to reclaim
+        if os.path.samefile(original, duplicate):
+            return None
+
+        if compare and not cmp(original, duplicate, shallow=False):
+            return "contents differ"
+
+        if mode == "delete":
+            duplicate.unlink()
+            return None
+
+        if mode == "hardlink":
+            os.link(original, temporary)
+            created = True
+        else:
+            reflink(original, temporary)
+            created = True
+            # clones are separate files, keep metadata of the duplicate
+            copystat(duplicate, temporary)
+            if hasattr(os, "chown"):
+                stat = duplicate.stat()
+                os.chown(temporary, stat.st_uid, stat.st_gid)
+        os.replace(temporary, duplicate)
+    except OSError as exc_info:
+        # only remove temporary file if created here
+        if created:
+            temporary.unlink(missing_ok=True)
+        return exc_info.strerror or str(exc_info)
+    return None
+
+
+@click.command()
+@click.option(
+    "-i", "--input-directory", "input_dir",
+    required=True,
+    type=click.Path(exists=True),
+    help="path to the input directory"
+)
+@click.option(
+    "--mode", "mode",
+    required=True,
+    type=click.Choice(
+        DEDUPE_MODES,
+        case_sensitive=True
+    ),
+    help="replace duplicates by hardlinks or reflinks (copy-on-write clones), or delete them"
+)
+@click.option(
+    "-m", "--hash-algorithm", "hash_algorithm",
+    default=list(methods.keys())[0],
+    show_default=True,
+    type=click.Choice(
+        list(methods.keys()),
+        case_sensitive=True
+    ),
+    help="specify the hash algorithm used to identify files"
+)
+@click.option(
+    "--compare/--no-compare", "compare",
+    default=True,
+    show_default=True,
+    help="compare files byte by byte before replacing duplicates"
+)
+@click.option(
+    "-j", "--jobs", "jobs",
+    default=None,
+    show_default="automatic",
+    type=click.IntRange(min=1),
+    help="number of threads used for replacing duplicates"
+)
+@filter_options
+@click.option(
+    "-v", "--verbose", "verbose",
+    is_flag=True,
+    help="verbose output"
+)
+def dedupe(
+    input_dir,
+    mode,
+    hash_algorithm,
+    compare,
+    jobs,
+    min_size,
+    max_size,
+    include,
+    exclude,
+    skip_empty,
+    verbose
+):
+    """
+    Remove file duplicates in an existing directory in place.
+    """
+
+    source = Path(input_dir)
+
+    # make sure the target is valid
+    if not source.is_dir():
+        if verbose:
+            click.echo(
+                f"Error: Invalid argument for input directory {input_dir}, directory does not exist.",
+                file=sys.stderr
+            )
+        sys.exit(1)
+
+    if verbose:
+        click.echo("analyzing..")
+
+    # find all files (symbolic links are not replaced)
+    list_of_files = [
+        p for p in src.list_files(
+            source,
+            min_size=min_size,
+            max_size=max_size,
+            include=include,
+            exclude=exclude,
+            skip_empty=skip_empty
+        ) if not p.is_symlink()
+    ]
+
+    if verbose:
+        click.echo(f"working on a set of {len(list_of_files)} files")
+
+    # run analysis
+    _, uniques = src.find_duplicates(
+        list_of_files,
+        hash_algorithm,
+        progress_hook=src.default_progress_hook if verbose else None
+    )
+
+    if verbose:
+        click.echo("\nreplacing duplicates..")
+
+    # replace duplicates
+    duplicates = [
+        (files[0], file) for files in uniques.values() for file in files[1:]
+    ]
+    problems = src.run_parallel(
+        lambda pair: replace_duplicate(*pair, mode, compare),
+        duplicates,
+        jobs=jobs,
+        progress_hook=src.default_progress_hook if verbose else None,
+        stage="replacing duplicates"
+    )
+    problems = {
+        duplicate: problem
+        for (_, duplicate), problem in zip(duplicates, problems)
+        if problem is not None
+    }
+
+    # print results
+    if verbose:
+        click.echo("")
+        click.echo(
+            f"number of replaced duplicates: {len(duplicates) - len(problems)}"
+        )
+        if problems:
+            click.echo("="*5 + " Details " + "="*5)
+            click.echo(
+                "\n".join(
+                    f" * {str(duplicate)} ({problem})"
+                    for duplicate, problem in problems.items()
+                )
+            )
+
+            click.echo("="*5 + " Summary " + "="*5)
+            click.echo(f"total number of skipped duplicates: {len(problems)}")
+    elif problems:
+        click.echo(
+            "\n".join(
+                f"{problem}: {str(duplicate)}"
+                for duplicate, problem in problems.items()
+            )
+        )
+
+    if problems:
+        sys.exit(1)
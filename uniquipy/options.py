@@ -0,0 +1,44 @@
+"""
+This module contains definitions of cli-options shared between commands.
+"""
+
+import click
+
+
+def filter_options(command):
+    """
+    Decorator adding the options for filtering input files (see
+    `list_files`) to `command`.
+    """
+
+    for option in reversed([
+        click.option(
+            "--min-size", "min_size",
+            default=None,
+            type=click.IntRange(min=0),
+            help="skip files smaller than this size (in bytes)"
+        ),
+        click.option(
+            "--max-size", "max_size",
+            default=None,
+            type=click.IntRange(min=0),
+            help="skip files larger than this size (in bytes)"
+        ),
+        click.option(
+            "--include", "include",
+            multiple=True,
+            help="only use files matching this glob pattern (file name or relative path); can be repeated"
+        ),
+        click.option(
+            "--exclude", "exclude",
+            multiple=True,
+            help="skip files and directories matching this glob pattern (file name or relative path); can be repeated"
+        ),
+        click.option(
+            "--skip-empty", "skip_empty",
+            is_flag=True,
+            help="skip empty files"
+        ),
+    ]):
+        command = option(command)
+    return command
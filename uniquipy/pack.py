@@ -1,19 +1,40 @@
 """
-This module contains the definition of the pack- and unpack-commands.
+This module contains the definition of the pack-, unpack-, and
+extract-commands.
 """
 
 import sys
-from shutil import copy
+import os
+import stat
+import json
+from typing import Optional, Iterable
 from pathlib import Path
 from datetime import datetime
-from importlib.metadata import version
 import click
-from uniquipy import src
+from uniquipy import src, compress, archive
 from uniquipy.src import HASHING_ALGORITHMS as methods
+from uniquipy.compress import COMPRESSION_METHODS as compression_methods
+from uniquipy.archive import \
+    data_dir_name, index_file_name, manifest_file_name, readme_file_name
+from uniquipy.options import filter_options
+from uniquipy.version import __version__
 
 
-data_dir_name = "data"
-index_file_name = "index.txt"
+def unavailable_compression(
+    reader: archive.ArchiveReader,
+    names: Iterable[str]
+) -> Optional[str]:
+    """
+    Returns the first compression method used by the blobs `names` of the
+    archive opened with `reader` that is not available in the current
+    environment (`None` if all are available).
+    """
+
+    for name in names:
+        compression = reader.compression(name)
+        if compression is not None and not compress.is_available(compression):
+            return compression
+    return None
 
 
 @click.command()
@@ -27,7 +48,7 @@ index_file_name = "index.txt"
     "-o", "--output-directory", "output_dir",
     required=True,
     type=click.Path(exists=False),
-    help="path to the (empty) output directory"
+    help="path to the (empty) output directory (or output file if '--container' is set)"
 )
 @click.option(
     "-m", "--hash-algorithm", "hash_algorithm",
@@ -39,6 +60,28 @@ index_file_name = "index.txt"
     ),
     help="specify the hash algorithm used to identify files"
 )
+@click.option(
+    "-c", "--compress", "compression",
+    default=None,
+    type=click.Choice(
+        compression_methods,
+        case_sensitive=True
+    ),
+    help="compress stored files (files that are already compressed are stored as is)"
+)
+@click.option(
+    "--container", "container",
+    is_flag=True,
+    help="write archive as single file instead of directory"
+)
+@click.option(
+    "-j", "--jobs", "jobs",
+    default=None,
+    show_default="automatic",
+    type=click.IntRange(min=1),
+    help="number of threads used for copying data"
+)
+@filter_options
 @click.option(
     "-v", "--verbose", "verbose",
     is_flag=True,
@@ -48,6 +91,14 @@ def pack(
     input_dir,
     output_dir,
     hash_algorithm,
+    compression,
+    container,
+    jobs,
+    min_size,
+    max_size,
+    include,
+    exclude,
+    skip_empty,
     verbose
 ):
     """
@@ -79,7 +130,14 @@ def pack(
         click.echo("analyzing..")
 
     # find all files
-    list_of_files = [p for p in source.glob("**/*") if p.is_file()]
+    list_of_files = src.list_files(
+        source,
+        min_size=min_size,
+        max_size=max_size,
+        include=include,
+        exclude=exclude,
+        skip_empty=skip_empty
+    )
 
     if verbose:
         click.echo(f"working on a set of {len(list_of_files)} files")
@@ -94,42 +152,102 @@ def pack(
     if verbose:
         click.echo("\npacking..")
 
+    # select compression method
+    _compression = compress.resolve_method(compression)
+    if verbose and _compression != compression:
+        click.echo(
+            f"Warning: Compression method '{compression}' is not available, using '{_compression}' instead.",
+            file=sys.stderr
+        )
+
+    groups = [
+        [str(file.relative_to(source)) for file in files]
+        for files in uniques.values()
+    ]
+    metadata = {
+        "version": __version__,
+        "hash_algorithm": hash_algorithm,
+        "compression": _compression,
+        "modes": {
+            str(file.relative_to(source)): stat.S_IMODE(file.stat().st_mode)
+            for files in uniques.values() for file in files
+        },
+    }
+
+    if container:
+        destination.parent.mkdir(parents=True, exist_ok=True)
+
+        # write data
+        with archive.ContainerWriter(destination, hash_algorithm) as writer:
+            src.run_parallel(
+                lambda files: writer.add_blob(
+                    str(files[0].relative_to(source)),
+                    files[0],
+                    _compression
+                ),
+                uniques.values(),
+                jobs=jobs,
+                progress_hook=src.default_progress_hook if verbose else None,
+                stage="copying data"
+            )
+
+            # write index
+            writer.close(metadata | {"groups": groups})
+
+        if verbose:
+            click.echo(f"\ncopied {str(len(uniques))} files")
+            click.echo(f"built archive of unique files at {str(destination)}")
+        return
+
     # write readme
     destination.mkdir(parents=True, exist_ok=False)
 
-    readme = destination / "readme.txt"
-    readme.write_text(f"""This archive has been generated with uniquipy v{version('uniquipy')} using the '{hash_algorithm}'-hashing method at {datetime.now().isoformat()}
+    readme = destination / readme_file_name
+    readme.write_text(f"""This archive has been generated with uniquipy v{__version__} using the '{hash_algorithm}'-hashing method at {datetime.now().isoformat()}
 See https://github.com/RichtersFinger/uniquipy for details.
 
 The data-directory contains a copy of the original directory where duplicates of files have been removed.
 Its original state can be restored with the 'unpack' command of uniquipy.
-""", encoding="utf-8")
+""" + (f"""Files in the data-directory may have been compressed using '{_compression}' (see 'manifest.json').
+""" if _compression else ""), encoding="utf-8")
 
     # write index
     index = destination / index_file_name
     index.write_text(
-        "\n\n".join(
-            "\n".join(
-                map(lambda file: str(file.relative_to(source)), files)
-            ) for files in uniques.values()
-        ),
+        "\n\n".join("\n".join(files) for files in groups),
         encoding="utf-8"
     )
 
     # write data
-    for progress, files in enumerate(uniques.values()):
-        file = files[0]
-
-        file_destination = destination / data_dir_name / file.relative_to(source)
+    def store(name):
+        file_destination = destination / data_dir_name / name
         file_destination.parent.mkdir(parents=True, exist_ok=True)
-        copy(file, file_destination)
-
-        if verbose:
-            src.default_progress_hook(
-                stage="copying data",
-                progress=(progress, len(uniques))
+        with open(file_destination, "w+b") as stream:
+            return archive.store_blob(
+                source / name, stream, _compression, hash_algorithm
             )
 
+    blobs = src.run_parallel(
+        store,
+        [files[0] for files in groups],
+        jobs=jobs,
+        progress_hook=src.default_progress_hook if verbose else None,
+        stage="copying data"
+    )
+
+    # write manifest
+    (destination / manifest_file_name).write_text(
+        json.dumps(
+            metadata | {
+                "blobs": {
+                    files[0]: blob for files, blob in zip(groups, blobs)
+                }
+            },
+            indent=2
+        ),
+        encoding="utf-8"
+    )
+
     if verbose:
         click.echo(f"\ncopied {str(len(uniques))} files")
         click.echo(f"built archive of unique files at {str(destination)}")
@@ -140,7 +258,7 @@ Its original state can be restored with the 'unpack' command of uniquipy.
     "-i", "--input-directory", "input_dir",
     required=True,
     type=click.Path(exists=True),
-    help="path to the (previously packed) input directory"
+    help="path to the (previously packed) input directory or container file"
 )
 @click.option(
     "-o", "--output-directory", "output_dir",
@@ -167,43 +285,162 @@ def unpack(
     destination = Path(output_dir)
 
     # make sure the target is valid
-    if not source.is_dir() \
-            or not (source / index_file_name).is_file() \
-            or not (source / data_dir_name).is_dir():
+    try:
+        reader = archive.open_archive(source)
+    except ValueError:
         if verbose:
             click.echo(
-                f"Error: Invalid argument for input directory {input_dir}, directory does not exist or has a bad format (expected 'index.txt' and 'data/').",
+                f"Error: Invalid argument for input directory {input_dir}, directory does not exist or has a bad format (expected container file or 'index.txt' and 'data/' as well as 'manifest.json' for compressed data).",
                 file=sys.stderr
             )
         sys.exit(1)
-    # make sure the destination is valid
-    if destination.exists():
+
+    with reader:
+        # make sure the destination is valid
+        if destination.exists():
+            if verbose:
+                click.echo(
+                    f"Error: Invalid argument for output directory {output_dir}, directory already exists.",
+                    file=sys.stderr
+                )
+            sys.exit(1)
+        # make sure the data can be decompressed
+        compression = unavailable_compression(
+            reader, [files[0] for files in reader.groups]
+        )
+        if compression is not None:
+            if verbose:
+                click.echo(
+                    f"Error: Compression method '{compression}' used in archive {input_dir} is not available (zstd requires python 3.14+ or the 'zstandard'-package).",
+                    file=sys.stderr
+                )
+            sys.exit(1)
+
         if verbose:
-            click.echo(
-                f"Error: Invalid argument for output directory {output_dir}, directory already exists.",
-                file=sys.stderr
-            )
-        sys.exit(1)
+            click.echo("reconstructing..")
+
+        # create directory structure
+        destination.mkdir(parents=True, exist_ok=False)
+        for directory in sorted({
+            (destination / file).parent
+            for files in reader.groups for file in files
+        }):
+            directory.mkdir(parents=True, exist_ok=True)
+
+        # read data
+        for progress, files in enumerate(reader.groups):
+            with reader.open_blob(files[0]) as stream:
+                archive.restore_blob(
+                    stream,
+                    [destination / file for file in files],
+                    reader.compression(files[0])
+                )
+            for file in files:
+                mode = reader.mode(file)
+                if mode is not None:
+                    os.chmod(destination / file, mode)
+
+            if verbose:
+                src.default_progress_hook(
+                    stage="making duplicates",
+                    progress=(progress, len(reader.groups))
+                )
 
     if verbose:
-        click.echo("reconstructing..")
+        click.echo("")
+        click.echo(f"rebuild from archive of unique files at {str(destination)}")
 
-    # read data
-    index = (source / index_file_name).read_text(encoding="utf-8")
-    uniques = index.split("\n\n")
 
-    for progress, unique in enumerate(uniques):
-        files = unique.split("\n")
-        for file in files:
-            (destination / file).parent.mkdir(parents=True, exist_ok=True)
-            copy(source / "data" / files[0], destination / file)
+@click.command()
+@click.option(
+    "-i", "--input-directory", "input_dir",
+    required=True,
+    type=click.Path(exists=True),
+    help="path to the (previously packed) input directory or container file"
+)
+@click.option(
+    "-p", "--path", "paths",
+    required=True,
+    multiple=True,
+    help="path of a file (relative to the packed directory) that should be extracted; can be repeated"
+)
+@click.option(
+    "-o", "--output-directory", "output_dir",
+    required=True,
+    type=click.Path(exists=False),
+    help="path to the output directory"
+)
+@click.option(
+    "-v", "--verbose", "verbose",
+    is_flag=True,
+    help="verbose output"
+)
+def extract(
+    input_dir,
+    paths,
+    output_dir,
+    verbose
+):
+    """
+    Extract individual files from a previously packed directory.
+    """
+
+    source = Path(input_dir)
+    destination = Path(output_dir)
 
+    # make sure the target is valid
+    try:
+        reader = archive.open_archive(source)
+    except ValueError:
         if verbose:
-            src.default_progress_hook(
-                stage="making duplicates",
-                progress=(progress, len(uniques))
+            click.echo(
+                f"Error: Invalid argument for input directory {input_dir}, directory does not exist or has a bad format (expected container file or 'index.txt' and 'data/' as well as 'manifest.json' for compressed data).",
+                file=sys.stderr
             )
+        sys.exit(1)
 
-    if verbose:
-        click.echo("")
-        click.echo(f"rebuild from archive of unique files at {str(destination)}")
+    with reader:
+        # make sure all paths are valid
+        groups = {}
+        for path in map(lambda p: str(Path(p)), paths):
+            groups[path] = reader.find_group(path)
+            if groups[path] is None:
+                if verbose:
+                    click.echo(
+                        f"Error: Invalid argument for path {path}, file is not part of the archive.",
+                        file=sys.stderr
+                    )
+                sys.exit(1)
+            if (destination / path).exists():
+                if verbose:
+                    click.echo(
+                        f"Error: Invalid argument for path {path}, file already exists in output directory.",
+                        file=sys.stderr
+                    )
+                sys.exit(1)
+        # make sure the data can be decompressed
+        compression = unavailable_compression(
+            reader, [files[0] for files in groups.values()]
+        )
+        if compression is not None:
+            if verbose:
+                click.echo(
+                    f"Error: Compression method '{compression}' used in archive {input_dir} is not available (zstd requires python 3.14+ or the 'zstandard'-package).",
+                    file=sys.stderr
+                )
+            sys.exit(1)
+
+        # read data
+        for path, files in groups.items():
+            (destination / path).parent.mkdir(parents=True, exist_ok=True)
+            with reader.open_blob(files[0]) as stream:
+                archive.restore_blob(
+                    stream,
+                    [destination / path],
+                    reader.compression(files[0])
+                )
+            mode = reader.mode(path)
+            if mode is not None:
+                os.chmod(destination / path, mode)
+            if verbose:
+                click.echo(f"extracted '{path}'")
@@ -2,8 +2,10 @@
 This module contains definitions implementing the uniquipy-logic.
 """
 
-from typing import Optional, Callable
+from typing import Optional, Callable, Iterable, Any, BinaryIO
 from pathlib import Path
+from fnmatch import fnmatch
+import os
 import hashlib
 
 HASHING_ALGORITHMS = {
@@ -36,22 +38,168 @@ def hash_from_file(
              (default False)
     """
 
+    with open(path, "rb") as file:
+        return hash_from_stream(algorithm, file, chunk_size, short)
+
+
+def hash_from_stream(
+    algorithm: str,
+    stream: BinaryIO,
+    chunk_size: int = 65536,
+    short: bool = False
+) -> str:
+    """
+    Returns the hash of the data read from `stream` as string (see
+    `hash_from_file` for details).
+
+    Keyword arguments:
+    algorithm -- string identifier for hashing method
+                 (see definition of `HASHING_ALGORITHMS`)
+    stream -- readable binary file object
+    chunk_size -- size of chunks
+                  (default 65536)
+    short -- whether to use entire stream for hashing or exit after first
+             chunk
+             (default False)
+    """
+
     # https://stackoverflow.com/a/22058673
     hashed = HASHING_ALGORITHMS[algorithm]()
 
-    with open(path, "rb") as file:
-        while (data := file.read(chunk_size)):
-            hashed.update(data)
-            if short:
-                break
+    while (data := stream.read(chunk_size)):
+        hashed.update(data)
+        if short:
+            break
+
+    return hashed.hexdigest()
+
+
+def hash_from_samples(
+    algorithm: str,
+    stream: BinaryIO,
+    size: int,
+    offset: int = 0,
+    block_size: int = 65536,
+    samples: int = 4
+) -> str:
+    """
+    Returns the hash of a number of blocks sampled evenly from the section
+    of `size` bytes at `offset` of `stream` as string. The first and last
+    block are always included.
+
+    Keyword arguments:
+    algorithm -- string identifier for hashing method
+                 (see definition of `HASHING_ALGORITHMS`)
+    stream -- readable and seekable binary file object
+    size -- size of the section
+    offset -- start of the section
+              (default 0)
+    block_size -- size of sampled blocks
+                  (default 65536)
+    samples -- number of sampled blocks
+               (default 4)
+    """
+
+    hashed = HASHING_ALGORITHMS[algorithm]()
+
+    positions = sorted({
+        i * max(0, size - block_size) // max(1, samples - 1)
+        for i in range(samples)
+    })
+    for position in positions:
+        stream.seek(offset + position)
+        hashed.update(stream.read(min(block_size, size - position)))
 
     return hashed.hexdigest()
 
 
+def _matches(path: str, name: str, patterns: Iterable[str]) -> bool:
+    """
+    Returns `True` if either the relative `path` or the `name` matches any
+    of the glob `patterns`.
+    """
+
+    return any(
+        fnmatch(path, pattern) or fnmatch(name, pattern)
+        for pattern in patterns
+    )
+
+
+def list_files(
+    source: Path,
+    min_size: Optional[int] = None,
+    max_size: Optional[int] = None,
+    include: Optional[Iterable[str]] = None,
+    exclude: Optional[Iterable[str]] = None,
+    skip_empty: bool = False
+) -> list[Path]:
+    """
+    Returns a list of all files below `source` that pass the given filters.
+    Filters are applied while walking the directory tree, i.e., excluded
+    directories are not entered. Symbolic links to directories are not
+    followed.
+
+    Keyword arguments:
+    source -- path to the directory
+    min_size -- minimum file size in bytes
+                (default None)
+    max_size -- maximum file size in bytes
+                (default None)
+    include -- glob patterns of which files need to match at least one (if
+               any); patterns are matched against the file name and the path
+               relative to `source`
+               (default None)
+    exclude -- glob patterns for files and directories that are skipped
+               (see `include`)
+               (default None)
+    skip_empty -- whether to skip files of size zero
+                  (default False)
+    """
+
+    if skip_empty:
+        min_size = max(min_size or 0, 1)
+
+    files = []
+    directories = [source]
+    while directories:
+        directory = directories.pop()
+        try:
+            with os.scandir(directory) as iterator:
+                entries = list(iterator)
+        except OSError:
+            # skip unreadable or vanished directories (like `Path.glob`)
+            continue
+        for entry in entries:
+            path = Path(entry.path)
+            relative = path.relative_to(source).as_posix()
+            if exclude and _matches(relative, entry.name, exclude):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                directories.append(path)
+                continue
+            if not entry.is_file():
+                continue
+            if include and not _matches(relative, entry.name, include):
+                continue
+            if min_size is not None or max_size is not None:
+                try:
+                    size = entry.stat().st_size
+                except OSError:
+                    continue
+                if min_size is not None and size < min_size:
+                    continue
+                if max_size is not None and size > max_size:
+                    continue
+            files.append(path)
+
+    return files
+
+
 def find_duplicates(
     files: list[Path],
     hash_algorithm: str = "md5",
-    progress_hook: Optional[Callable] = None
+    progress_hook: Optional[Callable] = None,
+    hash_function: Callable = hash_from_file
 ) -> tuple[bool, dict[str, list[Path]]]:
     """
     Returns a tuple of a boolean summary (whether or not duplicates exist among
@@ -71,17 +219,21 @@ def find_duplicates(
                                    total tasks for the given stage
                      are passed to the hook
                      (default None)
+    hash_function -- function used for hashing files; called with the same
+                     arguments as `hash_from_file` (e.g. to use cached
+                     results)
+                     (default `hash_from_file`)
     """
 
     # define the individual steps in the discrimination hierarchy
     discriminator_hierarchy = [
         lambda file: str(file.stat().st_size),
-        lambda file: hash_from_file(
+        lambda file: hash_function(
             hash_algorithm,
             str(file),
             short=True
         ),
-        lambda file: hash_from_file(
+        lambda file: hash_function(
             hash_algorithm,
             str(file)
         ),
@@ -134,6 +286,46 @@ def find_duplicates(
     return is_unique, uniques
 
 
+def run_parallel(
+    function: Callable,
+    items: Iterable,
+    jobs: Optional[int] = None,
+    progress_hook: Optional[Callable] = None,
+    stage: str = "processing"
+) -> list[Any]:
+    """
+    Returns a list of the results of `function` applied to every element of
+    `items` (in the order of `items`). The calls are distributed over a pool
+    of threads.
+
+    Keyword arguments:
+    function -- callable that accepts a single positional argument
+    items -- iterable of arguments for `function`
+    jobs -- number of worker threads; `None` lets the executor decide
+            (default None)
+    progress_hook -- hook that is executed on progress
+                     (see `find_duplicates` for details)
+                     (default None)
+    stage -- string-identifier of the stage passed to the `progress_hook`
+             (default "processing")
+    """
+
+    # deferred import, not needed by all commands
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(function, item) for item in items]
+        for progress, future in enumerate(as_completed(futures)):
+            # re-raise errors early
+            future.result()
+            if progress_hook is not None:
+                progress_hook(
+                    stage=stage,
+                    progress=(progress + 1, len(futures))
+                )
+        return [future.result() for future in futures]
+
+
 def default_progress_hook(**kwargs) -> None:
     """
     Default progress-hook that can be used with the function `find_duplicates`.
@@ -0,0 +1,197 @@
+"""
+This module contains the definition of the verify-command.
+"""
+
+from typing import Optional
+import sys
+from pathlib import Path
+import click
+from uniquipy import src, compress, archive
+
+
+def verify_blob(
+    reader: archive.ArchiveReader,
+    name: str,
+    fast: bool = False
+) -> Optional[str]:
+    """
+    Returns a description of the damage detected for the blob `name` of
+    the archive opened with `reader` (`None` if intact). Raises `OSError` if
+    the stored data cannot be read and `ValueError` if no digest has been
+    recorded or its compression method is not available, i.e., if the blob
+    cannot be checked.
+
+    Keyword arguments:
+    reader -- `ArchiveReader` of the archive
+    name -- identifier of the blob
+    fast -- whether to check only size and sampled blocks of the stored data
+            instead of rehashing the original contents
+            (default False)
+    """
+
+    stored_size = reader.stored_size(name)
+    if stored_size is None:
+        return "missing"
+
+    # archives generated with older versions come without digests
+    blob = reader.blobs.get(name)
+    hash_algorithm = reader.metadata.get("hash_algorithm")
+    if blob is None or hash_algorithm is None:
+        raise ValueError("no digest recorded")
+
+    if "stored_size" in blob and stored_size != blob["stored_size"]:
+        return "size mismatch"
+
+    if fast:
+        if "sample_digest" not in blob:
+            raise ValueError("no sample digest recorded")
+        with reader.open_blob(name) as stream:
+            sample_digest = src.hash_from_samples(
+                hash_algorithm, stream, stored_size
+            )
+        if sample_digest != blob["sample_digest"]:
+            return "corrupt"
+        return None
+
+    if "digest" not in blob:
+        raise ValueError("no digest recorded")
+    compression = blob.get("compression")
+    if compression is not None and not compress.is_available(compression):
+        raise ValueError(
+            f"compression method '{compression}' is not available"
+        )
+    with reader.open_blob(name) as stream:
+        if compression is None:
+            digest = src.hash_from_stream(
+                hash_algorithm, stream, archive.chunk_size
+            )
+        else:
+            try:
+                with compress.decompressor(
+                    compression, stream
+                ) as f_decompressed:
+                    digest = src.hash_from_stream(
+                        hash_algorithm, f_decompressed, archive.chunk_size
+                    )
+            except compress.DECOMPRESSION_ERRORS:
+                return "corrupt"
+    if digest != blob["digest"]:
+        return "corrupt"
+    return None
+
+
+@click.command()
+@click.option(
+    "-i", "--input-directory", "input_dir",
+    required=True,
+    type=click.Path(exists=True),
+    help="path to the (previously packed) input directory or container file"
+)
+@click.option(
+    "--fast", "fast",
+    is_flag=True,
+    help="only check sizes and sampled blocks of stored data"
+)
+@click.option(
+    "-j", "--jobs", "jobs",
+    default=None,
+    show_default="automatic",
+    type=click.IntRange(min=1),
+    help="number of threads used for reading data"
+)
+@click.option(
+    "-v", "--verbose", "verbose",
+    is_flag=True,
+    help="verbose output"
+)
+def verify(
+    input_dir,
+    fast,
+    jobs,
+    verbose
+):
+    """
+    Verify the integrity of a previously packed directory.
+    """
+
+    source = Path(input_dir)
+
+    # make sure the target is valid
+    try:
+        reader = archive.open_archive(source)
+    except ValueError:
+        if verbose:
+            click.echo(
+                f"Error: Invalid argument for input directory {input_dir}, directory does not exist or has a bad format (expected container file or 'index.txt' and 'data/' as well as 'manifest.json' for compressed data).",
+                file=sys.stderr
+            )
+        sys.exit(1)
+
+    if verbose:
+        click.echo("verifying..")
+
+    def check(name):
+        try:
+            return verify_blob(reader, name, fast), None
+        except (OSError, ValueError) as exc_info:
+            return None, getattr(exc_info, "strerror", None) or str(exc_info)
+
+    with reader:
+        names = [files[0] for files in reader.groups]
+        results = src.run_parallel(
+            check,
+            names,
+            jobs=jobs,
+            progress_hook=src.default_progress_hook if verbose else None,
+            stage="checking data"
+        )
+
+    # print results
+    problems = {
+        name: problem for name, (problem, _) in zip(names, results)
+        if problem is not None
+    }
+    unchecked = {
+        name: error for name, (_, error) in zip(names, results)
+        if error is not None
+    }
+    if verbose:
+        click.echo("")
+        click.echo(f"number of checked files: {len(names) - len(unchecked)}")
+
+        if not problems and not unchecked:
+            click.echo("archive is intact")
+        else:
+            click.echo("="*5 + " Details " + "="*5)
+            click.echo(
+                "\n".join(
+                    [
+                        f" * {name} ({problem})"
+                        for name, problem in problems.items()
+                    ] + [
+                        f" * {name} (unchecked: {error})"
+                        for name, error in unchecked.items()
+                    ]
+                )
+            )
+
+            click.echo("="*5 + " Summary " + "="*5)
+            click.echo(f"total number of damaged files: {len(problems)}")
+            click.echo(f"total number of unchecked files: {len(unchecked)}")
+    elif problems or unchecked:
+        click.echo(
+            "\n".join(
+                [
+                    f"{problem}: {name}" for name, problem in problems.items()
+                ] + [
+                    f"unchecked: {name} ({error})"
+                    for name, error in unchecked.items()
+                ]
+            )
+        )
+
+    # damage takes precedence over incomplete checks
+    if problems:
+        sys.exit(1)
+    if unchecked:
+        sys.exit(2)
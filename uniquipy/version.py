@@ -0,0 +1,5 @@
+"""
+This module defines the version of uniquipy (also read by setup.py).
+"""
+
+__version__ = "1.1.0"
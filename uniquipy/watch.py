@@ -0,0 +1,602 @@
+"""
+This module contains the definition of the watch- and query-commands.
+"""
+
+from typing import Optional, Callable
+import sys
+import os
+import errno
+import select
+import socket
+import struct
+import ctypes
+import ctypes.util
+from pathlib import Path
+from threading import Lock, Thread, Event
+from time import monotonic
+import click
+from uniquipy import src
+from uniquipy.src import HASHING_ALGORITHMS as methods
+
+
+class DuplicateIndex:
+    """
+    Index of the files in a directory that can be updated incrementally.
+    File hashes are cached until the size or modification time of the
+    corresponding file changes.
+
+    Keyword arguments:
+    source -- path to the indexed directory
+    hash_algorithm -- string identifier for the hashing algorithm used
+                      (see definition of `HASHING_ALGORITHMS`)
+                      (default 'md5')
+    """
+
+    def __init__(self, source: Path, hash_algorithm: str = "md5") -> None:
+        self.source = source
+        self.hash_algorithm = hash_algorithm
+        self._lock = Lock()
+        # path -> (size, mtime)
+        self._files = {}
+        # size -> set of paths
+        self._sizes = {}
+        # (path, short) -> (size, mtime), hash
+        self._hashes = {}
+        self._groups = None
+        # incremented on every change of the index
+        self._generation = 0
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def update(self, path: Path) -> bool:
+        """
+        Adds/updates the entry for `path` (or removes it if it is no regular
+        file) and returns `True` if the index has changed.
+        """
+
+        try:
+            stat = path.stat() if path.is_file() else None
+        except OSError:
+            stat = None
+        if stat is None:
+            return self.remove(path)
+
+        with self._lock:
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if self._files.get(path) == signature:
+                return False
+            self._remove(path)
+            self._files[path] = signature
+            self._sizes.setdefault(stat.st_size, set()).add(path)
+            self._groups = None
+            self._generation += 1
+            return True
+
+    def remove(self, path: Path) -> bool:
+        """
+        Removes the entry for `path` as well as all entries below `path` and
+        returns `True` if the index has changed.
+        """
+
+        with self._lock:
+            if path in self._files:
+                self._remove(path)
+                return True
+            # directory
+            removed = [p for p in self._files if path in p.parents]
+            for p in removed:
+                self._remove(p)
+            return len(removed) > 0
+
+    def _remove(self, path: Path) -> None:
+        if path not in self._files:
+            return
+        size, _ = self._files.pop(path)
+        self._sizes[size].discard(path)
+        if not self._sizes[size]:
+            del self._sizes[size]
+        self._hashes.pop((str(path), True), None)
+        self._hashes.pop((str(path), False), None)
+        self._groups = None
+        self._generation += 1
+
+    def scan(self, directory: Optional[Path] = None) -> set[Path]:
+        """
+        Adds/updates the entries for all files below `directory` (default
+        `source`) and returns the set of files.
+        """
+
+        files = set()
+        for root, _, filenames in os.walk(directory or self.source):
+            for filename in filenames:
+                path = Path(root) / filename
+                self.update(path)
+                files.add(path)
+        return files
+
+    def rescan(self) -> None:
+        """
+        Synchronizes the index with the current state of `source`. Only new
+        or modified files need to be hashed again.
+        """
+
+        files = self.scan()
+        for path in set(self._files) - files:
+            self.remove(path)
+
+    def _hash(
+        self,
+        signature: tuple[int, int],
+        algorithm: str,
+        path: str,
+        chunk_size: int = 65536,
+        short: bool = False
+    ) -> str:
+        with self._lock:
+            cached = self._hashes.get((path, short))
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        try:
+            hashed = src.hash_from_file(algorithm, path, chunk_size, short)
+        except OSError:
+            # file vanished or is inaccessible, keep it separate
+            return f"error:{path}"
+
+        with self._lock:
+            # do not cache if the file has changed in the meantime
+            if self._files.get(Path(path)) == signature:
+                self._hashes[(path, short)] = (signature, hashed)
+        return hashed
+
+    def groups(self) -> list[list[Path]]:
+        """
+        Returns list of groups of identical files. Files are hashed without
+        blocking updates of the index.
+        """
+
+        with self._lock:
+            if self._groups is not None:
+                return self._groups
+
+            # only files that share their size with other files need to be
+            # hashed
+            generation = self._generation
+            candidates = {
+                path: self._files[path]
+                for paths in self._sizes.values() if len(paths) > 1
+                for path in paths
+            }
+
+        while True:
+            try:
+                _, uniques = src.find_duplicates(
+                    [p for p in candidates if p.is_file()],
+                    self.hash_algorithm,
+                    hash_function=lambda algorithm, path, *args, **kwargs: \
+                        self._hash(
+                            candidates[Path(path)],
+                            algorithm,
+                            path,
+                            *args,
+                            **kwargs
+                        )
+                )
+                break
+            except OSError:
+                # file vanished after checking, retry without it
+                continue
+        groups = sorted(
+            sorted(files) for files in uniques.values() if len(files) > 1
+        )
+
+        with self._lock:
+            # result is outdated if the index has changed in the meantime
+            if self._generation == generation:
+                self._groups = groups
+        return groups
+
+
+class PollingWatcher:
+    """
+    Keeps a `DuplicateIndex` up to date by rescanning the directory
+    periodically.
+
+    Keyword arguments:
+    index -- `DuplicateIndex` that is updated
+    interval -- time between two scans in seconds
+                (default 5.0)
+    """
+
+    def __init__(self, index: DuplicateIndex, interval: float = 5.0) -> None:
+        self.index = index
+        self.interval = interval
+
+    def run(self, stop: Event) -> None:
+        """Runs until `stop` is set."""
+
+        while not stop.wait(self.interval):
+            self.index.rescan()
+
+    def close(self) -> None:
+        """Releases resources."""
+
+
+class InotifyWatcher:
+    """
+    Keeps a `DuplicateIndex` up to date based on inotify-events (linux
+    only; raises `OSError` if not available or if the directory cannot be
+    watched completely, e.g., if the limit of watches is reached). If watches
+    cannot be added for directories created later on, the index is
+    additionally rescanned periodically.
+
+    Keyword arguments:
+    index -- `DuplicateIndex` that is updated
+    interval -- time between two scans in seconds if not all directories
+                can be watched
+                (default 5.0)
+    warning_hook -- hook that is executed with a message if not all
+                    directories can be watched
+                    (default None)
+    """
+
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO \
+        | IN_CREATE | IN_DELETE | IN_ONLYDIR
+
+    _event = struct.Struct("iIII")
+
+    def __init__(
+        self,
+        index: DuplicateIndex,
+        interval: float = 5.0,
+        warning_hook: Optional[Callable] = None
+    ) -> None:
+        self.index = index
+        self.interval = interval
+        self.warning_hook = warning_hook
+        self._polling = False
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is not supported on this platform.")
+        self._libc = ctypes.CDLL(
+            ctypes.util.find_library("c") or "libc.so.6", use_errno=True
+        )
+        self._fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        # watch descriptor -> directory
+        self._watches = {}
+        try:
+            self._watch(index.source)
+        except OSError:
+            os.close(self._fd)
+            raise
+
+    def _watch(self, directory: Path) -> None:
+        """
+        Adds watches for `directory` and all its subdirectories (raises
+        `OSError` if a watch cannot be added).
+        """
+
+        for root, _, _ in os.walk(directory):
+            wd = self._libc.inotify_add_watch(
+                self._fd, os.fsencode(root), self.MASK
+            )
+            if wd < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOENT:
+                    # directory has been removed in the meantime
+                    continue
+                raise OSError(
+                    error,
+                    f"inotify_add_watch failed ({os.strerror(error)})",
+                    root
+                )
+            self._watches[wd] = Path(root)
+
+    def _unwatch(self, directory: Path) -> None:
+        """Removes watches for `directory` and all its subdirectories."""
+
+        for wd, path in list(self._watches.items()):
+            if path == directory or directory in path.parents:
+                self._libc.inotify_rm_watch(self._fd, wd)
+                del self._watches[wd]
+
+    def _handle(self, wd: int, mask: int, name: str) -> None:
+        if mask & self.IN_Q_OVERFLOW:
+            # events have been lost
+            self.index.rescan()
+            return
+        if mask & self.IN_IGNORED:
+            self._watches.pop(wd, None)
+            return
+        if wd not in self._watches:
+            return
+
+        path = self._watches[wd] / name
+        if mask & self.IN_ISDIR:
+            if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                try:
+                    self._watch(path)
+                except OSError as exc_info:
+                    self._fall_back(exc_info)
+                # files may have been created before the watch was added
+                self.index.scan(path)
+            elif mask & (self.IN_DELETE | self.IN_MOVED_FROM):
+                self._unwatch(path)
+                self.index.remove(path)
+        elif mask & (self.IN_DELETE | self.IN_MOVED_FROM):
+            self.index.remove(path)
+        else:
+            self.index.update(path)
+
+    def _fall_back(self, exc_info: OSError) -> None:
+        """Enables periodic rescans in addition to events."""
+
+        if self._polling:
+            return
+        self._polling = True
+        if self.warning_hook is not None:
+            self.warning_hook(
+                f"Filesystem events are not available for all directories ({exc_info}), rescanning every {self.interval} seconds in addition."
+            )
+
+    def run(self, stop: Event, timeout: float = 0.5) -> None:
+        """Runs until `stop` is set."""
+
+        last_rescan = monotonic()
+        while not stop.is_set():
+            if self._polling and monotonic() - last_rescan >= self.interval:
+                self.index.rescan()
+                last_rescan = monotonic()
+            ready, _, _ = select.select(
+                [self._fd], [], [], min(timeout, self.interval)
+            )
+            if not ready:
+                continue
+            try:
+                data = os.read(self._fd, 65536)
+            except BlockingIOError:
+                continue
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = self._event.unpack_from(data, offset)
+                offset += self._event.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+                offset += length
+                self._handle(wd, mask, name)
+
+    def close(self) -> None:
+        """Releases resources."""
+
+        os.close(self._fd)
+
+
+def format_groups(groups: list[list[Path]]) -> str:
+    """Returns groups of identical files as text (see `analyze`)."""
+
+    return "\n\n".join("\n".join(map(str, files)) for files in groups)
+
+
+def serve(index: DuplicateIndex, server: socket.socket, stop: Event) -> None:
+    """
+    Sends the current groups of identical files to every client connecting
+    to the (listening) socket `server` until `stop` is set.
+    """
+
+    server.settimeout(0.5)
+    while not stop.is_set():
+        try:
+            connection, _ = server.accept()
+        except OSError:
+            # timeout or transient error (e.g., too many open files)
+            continue
+        with connection:
+            try:
+                connection.sendall(
+                    format_groups(index.groups()).encode("utf-8")
+                )
+            except OSError:
+                # client disconnected or index could not be evaluated, keep
+                # serving other clients
+                continue
+
+
+def query_socket(socket_path: Path, timeout: Optional[float] = 60.0) -> str:
+    """
+    Returns response of the watch-process at `socket_path` (raises
+    `OSError` on failure, e.g., `TimeoutError` if the watch-process does not
+    respond within `timeout` seconds).
+    """
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(str(socket_path))
+        response = b""
+        while (data := client.recv(65536)):
+            response += data
+    return response.decode("utf-8")
+
+
+@click.command()
+@click.option(
+    "-i", "--input-directory", "input_dir",
+    required=True,
+    type=click.Path(exists=True),
+    help="path to the input directory"
+)
+@click.option(
+    "-s", "--socket", "socket_path",
+    required=True,
+    type=click.Path(exists=False),
+    help="path to the unix socket used for queries"
+)
+@click.option(
+    "-m", "--hash-algorithm", "hash_algorithm",
+    default=list(methods.keys())[0],
+    show_default=True,
+    type=click.Choice(
+        list(methods.keys()),
+        case_sensitive=True
+    ),
+    help="specify the hash algorithm used to identify files"
+)
+@click.option(
+    "--poll", "poll",
+    is_flag=True,
+    help="detect changes by periodically rescanning instead of filesystem events"
+)
+@click.option(
+    "--interval", "interval",
+    default=5.0,
+    show_default=True,
+    type=click.FloatRange(min=0, min_open=True),
+    help="time between rescans in seconds (with '--poll' or if not all directories can be watched)"
+)
+@click.option(
+    "-v", "--verbose", "verbose",
+    is_flag=True,
+    help="verbose output"
+)
+def watch(
+    input_dir,
+    socket_path,
+    hash_algorithm,
+    poll,
+    interval,
+    verbose
+):
+    """
+    Watch existing directory and keep track of file duplicates. The current
+    groups of identical files can be requested with the query-command.
+    """
+
+    source = Path(input_dir)
+    socket_path = Path(socket_path)
+
+    # make sure the target is valid
+    if not source.is_dir():
+        if verbose:
+            click.echo(
+                f"Error: Invalid argument for input directory {input_dir}, directory does not exist.",
+                file=sys.stderr
+            )
+        sys.exit(1)
+    # make sure the socket is valid
+    if socket_path.exists():
+        if verbose:
+            click.echo(
+                f"Error: Invalid argument for socket {str(socket_path)}, file already exists.",
+                file=sys.stderr
+            )
+        sys.exit(1)
+
+    if verbose:
+        click.echo("analyzing..")
+
+    # build index
+    index = DuplicateIndex(source, hash_algorithm)
+    watcher = None
+    if not poll:
+        try:
+            watcher = InotifyWatcher(
+                index,
+                interval,
+                warning_hook=(
+                    lambda message: click.echo(
+                        f"Warning: {message}", file=sys.stderr
+                    )
+                ) if verbose else None
+            )
+        except OSError as exc_info:
+            if verbose:
+                click.echo(
+                    f"Warning: Filesystem events are not available ({exc_info}), using polling instead.",
+                    file=sys.stderr
+                )
+    if watcher is None:
+        watcher = PollingWatcher(index, interval)
+    index.rescan()
+    groups = index.groups()
+
+    if verbose:
+        click.echo(f"working on a set of {len(index)} files")
+        click.echo(f"number of groups of duplicates: {len(groups)}")
+        click.echo(f"watching {str(source)}, queries at {str(socket_path)}")
+
+    # run
+    stop = Event()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(str(socket_path))
+        server.listen()
+        thread = Thread(target=serve, args=(index, server, stop))
+        thread.start()
+        try:
+            watcher.run(stop)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stop.set()
+            thread.join()
+            watcher.close()
+            socket_path.unlink(missing_ok=True)
+
+    if verbose:
+        click.echo("stopped watching")
+
+
+@click.command()
+@click.option(
+    "-s", "--socket", "socket_path",
+    required=True,
+    type=click.Path(exists=True),
+    help="path to the unix socket of a running watch-command"
+)
+@click.option(
+    "-t", "--timeout", "timeout",
+    default=60.0,
+    show_default=True,
+    type=click.FloatRange(min=0, min_open=True),
+    help="time to wait for a response in seconds"
+)
+@click.option(
+    "-v", "--verbose", "verbose",
+    is_flag=True,
+    help="verbose output"
+)
+def query(
+    socket_path,
+    timeout,
+    verbose
+):
+    """
+    Query the current groups of identical files from a running
+    watch-command.
+    """
+
+    try:
+        response = query_socket(Path(socket_path), timeout)
+    except OSError as exc_info:
+        if verbose:
+            click.echo(
+                f"Error: Unable to query socket {socket_path} ({exc_info}).",
+                file=sys.stderr
+            )
+        sys.exit(1)
+
+    if response:
+        click.echo(response)
+    elif verbose:
+        click.echo("no duplicates found")